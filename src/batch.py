@@ -0,0 +1,82 @@
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from pathlib import Path
+from time import perf_counter
+from typing import Iterable, Optional
+import json
+import os
+import click
+
+from cache import DEFAULT_CACHE_DIR, ResultCache, solve
+
+
+def collect_files(specs: Iterable[str]) -> list[str]:
+    files: list[str] = []
+    for spec in specs:
+        if os.path.isdir(spec):
+            files.extend(sorted(str(path) for path in Path(spec).iterdir()
+                                if path.is_file()))
+        else:
+            files.extend(sorted(glob(spec, recursive=True)))
+    return files
+
+
+_day: int = 0
+_parts: tuple[str, ...] = ()
+_cache: Optional[ResultCache] = None
+
+
+def _init_worker(
+    day: int,
+    parts: tuple[str, ...],
+    cache: Optional[ResultCache]
+):
+    global _day, _parts, _cache
+    _day = day
+    _parts = parts
+    _cache = cache
+
+
+def _solve_file(path: str) -> dict[str, object]:
+    res: dict[str, object] = {'file': path}
+    start = perf_counter()
+    try:
+        data = Path(path).read_bytes()
+        for part in _parts:
+            res[part] = solve(_day, [part], data, _cache)
+    except Exception as e:
+        res['error'] = repr(e)
+    res['elapsed'] = perf_counter() - start
+    return res
+
+
+@click.command()
+@click.argument('day', type=int)
+@click.argument('inputs', nargs=-1, required=True)
+@click.option('-p', '--part', 'parts', multiple=True,
+              default=('part1', 'part2'), show_default=True)
+@click.option('-j', '--workers', type=int, default=os.cpu_count(),
+              show_default=True)
+@click.option('--chunksize', type=int, default=1, show_default=True)
+@click.option('--cache-dir', type=click.Path(path_type=Path),
+              default=DEFAULT_CACHE_DIR, show_default=True)
+@click.option('--no-cache', is_flag=True)
+def main(day: int, inputs: tuple[str, ...], parts: tuple[str, ...],
+         workers: int, chunksize: int, cache_dir: Path, no_cache: bool):
+    """
+    Solves every input file given as a directory or glob for DAY, printing
+    one JSON line per file in input order.
+
+    Each worker imports the day module at most once, on its first cache miss.
+    """
+    files = collect_files(inputs)
+    cache = None if no_cache else ResultCache(cache_dir)
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(day, parts, cache)) as executor:
+        for res in executor.map(_solve_file, files, chunksize=chunksize):
+            click.echo(json.dumps(res))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from functools import partial
+from math import ceil
+from time import perf_counter
+from typing import Callable, Optional, Sequence, TextIO
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import tracemalloc
+import click
+
+from digitgrid import DigitGrid
+from runner import ROOT, available_days, input_files, load_day, run_command
+
+
+@click.group()
+def main(): pass
+
+
+@dataclass
+class Timings:
+    min: float
+    median: float
+    p95: float
+
+    @staticmethod
+    def of(samples: Sequence[float]) -> "Timings":
+        ordered = sorted(samples)
+        return Timings(min=ordered[0],
+                       median=statistics.median(ordered),
+                       p95=ordered[ceil(0.95 * len(ordered)) - 1])
+
+
+def time_repeats(fn: Callable[[], object], repeat: int) -> Timings:
+    samples: list[float] = []
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        samples.append(perf_counter() - start)
+    return Timings.of(samples)
+
+
+def peak_memory(fn: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+@dataclass
+class Result:
+    day: int
+    part: str
+    input: str
+    repeat: int
+    answer: Optional[str] = None
+    timings: Optional[Timings] = None
+    peak_bytes: Optional[int] = None
+    error: Optional[str] = None
+
+
+def bench_day(
+    day: int,
+    parts: Sequence[str],
+    repeat: int
+) -> list[Result]:
+    paths = input_files(day)
+    results: list[Result] = []
+    try:
+        module = load_day(day)
+    except Exception as e:
+        for part in parts:
+            for path in paths:
+                results.append(Result(day, part, str(path.relative_to(ROOT)),
+                                      repeat, error=repr(e)))
+        return results
+
+    for part in parts:
+        for path in paths:
+            data = path.read_bytes()
+            result = Result(day, part, str(path.relative_to(ROOT)), repeat)
+            solve = partial(run_command, module, [part], data)
+            try:
+                result.answer = solve()
+                result.timings = time_repeats(solve, repeat)
+                result.peak_bytes = peak_memory(solve)
+            except Exception as e:
+                result.error = repr(e)
+            results.append(result)
+
+    return results
+
+
+def print_summary(results: Sequence[Result], out: TextIO):
+    for r in results:
+        label = f'day{r.day} {r.part} {r.input}'
+        if r.timings is None or r.peak_bytes is None:
+            print(f'{label:40} error: {r.error}', file=out)
+            continue
+
+        print(f'{label:40} '
+              f'min {r.timings.min * 1e3:9.3f}ms '
+              f'median {r.timings.median * 1e3:9.3f}ms '
+              f'p95 {r.timings.p95 * 1e3:9.3f}ms '
+              f'peak {r.peak_bytes / 1024:10.1f}KiB', file=out)
+
+
+@main.command()
+@click.option('-d', '--day', 'days', type=int, multiple=True,
+              help='Day to benchmark; may be repeated. Defaults to all.')
+@click.option('-p', '--part', 'parts', multiple=True,
+              default=('part1', 'part2'), show_default=True)
+@click.option('-r', '--repeat', default=5, show_default=True, type=int)
+@click.option('-o', '--output', type=click.File('w'), default='-',
+              help='Where to write the JSON report.')
+def run(days: tuple[int, ...], parts: tuple[str, ...], repeat: int,
+        output: TextIO):
+    results: list[Result] = []
+    for day in days or available_days():
+        day_results = bench_day(day, parts, repeat)
+        print_summary(day_results, sys.stderr)
+        results.extend(day_results)
+
+    json.dump({
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': [asdict(r) for r in results],
+    }, output, indent=2)
+    output.write('\n')
+
+
+def random_digit_grid(height: int, width: int, seed: int = 0) -> DigitGrid:
+    to_risk = bytes(v % 9 + 1 for v in range(256))
+    cells = random.Random(seed).randbytes(height * width).translate(to_risk)
+    return DigitGrid(bytearray(cells), height, width)
+
+
+def print_timings(label: str, timings: Timings, answer: object):
+    print(f'{label:40} '
+          f'min {timings.min * 1e3:10.3f}ms '
+          f'median {timings.median * 1e3:10.3f}ms '
+          f'p95 {timings.p95 * 1e3:10.3f}ms '
+          f'-> {answer}')
+
+
+@main.command()
+@click.option('-s', '--size', 'sizes', type=int, multiple=True,
+              default=(1000,), show_default=True,
+              help='Side length of a random square grid; may be repeated.')
+@click.option('-e', '--engine', 'engines', multiple=True)
+@click.option('-r', '--repeat', default=3, show_default=True, type=int)
+def day15_engines(sizes: tuple[int, ...], engines: tuple[str, ...],
+                  repeat: int):
+    """
+    Compares day15 shortest path engines on the 5x extended puzzle input and
+    on random grids.
+    """
+    day15 = load_day(15)
+
+    grids: list[tuple[str, DigitGrid]] = []
+    with open(ROOT / 'inputs' / 'day15.txt') as f:
+        grids.append(('inputs/day15.txt x5', day15.get_extended_grid(f)))
+    for size in sizes:
+        grids.append((f'random {size}x{size}', random_digit_grid(size, size)))
+
+    for label, grid in grids:
+        for engine in engines or [e.value for e in day15.Engine]:
+            solve = partial(day15.get_min_risk, grid, day15.Engine(engine))
+            stats = day15.SearchStats()
+            answer = day15.get_min_risk(grid, day15.Engine(engine),
+                                        stats=stats)
+            print_timings(f'{label} {engine}', time_repeats(solve, repeat),
+                          f'{answer} ({stats.expanded} expanded)')
+
+
+def encode_literal(version: int, value: int) -> str:
+    digits = f'{value:b}'
+    digits = digits.zfill(-(-len(digits) // 4) * 4)
+    groups = [digits[i:i+4] for i in range(0, len(digits), 4)]
+    return (f'{version:03b}100' +
+            ''.join('1' + g for g in groups[:-1]) + '0' + groups[-1])
+
+
+def encode_operator(version: int, type_id: int, subpackets: list[str]) -> str:
+    body = ''.join(subpackets)
+    if len(body) < 2 ** 15:
+        return f'{version:03b}{type_id:03b}0{len(body):015b}' + body
+    return f'{version:03b}{type_id:03b}1{len(subpackets):011b}' + body
+
+
+def bits_to_hex(bits: str) -> str:
+    bits += '0' * (-len(bits) % 8)
+    return f'{int(bits, 2):0{len(bits) // 4}X}'
+
+
+def random_transmission(num_bytes: int, seed: int = 0) -> str:
+    """
+    Builds a random BITS transmission of about num_bytes bytes: sum, min and
+    max operators of up to 2047 subpackets each, over random literals.
+    """
+    rng = random.Random(seed)
+    packets = [encode_literal(rng.randrange(8), rng.randrange(2 ** 16))
+               for _ in range(num_bytes * 8 // 26)]
+    while len(packets) > 1:
+        groups = []
+        for i in range(0, len(packets), 2047):
+            groups.append(encode_operator(rng.randrange(8),
+                                          rng.choice((0, 2, 3)),
+                                          packets[i:i+2047]))
+        packets = groups
+    return bits_to_hex(packets[0])
+
+
+@main.command()
+@click.option('-s', '--size', 'sizes', type=int, multiple=True,
+              default=(1 << 20, 4 << 20), show_default=True,
+              help='Transmission size in bytes; may be repeated.')
+@click.option('-r', '--repeat', default=3, show_default=True, type=int)
+def day16_decode(sizes: tuple[int, ...], repeat: int):
+    """
+    Times decoding and evaluating random multi-megabyte day16 transmissions.
+    """
+    day16 = load_day(16)
+    for size in sizes:
+        transmission = random_transmission(size)
+        packet = day16.get_packet(io.StringIO(transmission))
+        label = f'random {len(transmission) // 2 / 2**20:.1f}MiB'
+        print_timings(f'{label} parse',
+                      time_repeats(lambda: day16.get_packet(
+                          io.StringIO(transmission)), repeat),
+                      day16.version_sum(packet))
+        print_timings(f'{label} eval',
+                      time_repeats(packet.eval, repeat), packet.eval())
+
+
+def nested_transmission(depth: int, seed: int = 0) -> str:
+    """
+    Builds a BITS transmission of depth single-subpacket operators wrapped
+    around one literal.
+    """
+    rng = random.Random(seed)
+    headers = ''.join(f'{rng.randrange(8):03b}{rng.randrange(4):03b}1'
+                      f'{1:011b}' for _ in range(depth))
+    return bits_to_hex(headers + encode_literal(rng.randrange(8), 2021))
+
+
+@main.command()
+@click.option('-d', '--depth', 'depths', type=int, multiple=True,
+              default=(100_000,), show_default=True)
+@click.option('-r', '--repeat', default=3, show_default=True, type=int)
+def day16_nested(depths: tuple[int, ...], repeat: int):
+    """
+    Times decoding and evaluating deeply nested day16 transmissions.
+    """
+    day16 = load_day(16)
+    for depth in depths:
+        transmission = nested_transmission(depth)
+        packet = day16.get_packet(io.StringIO(transmission))
+        label = f'nested {depth}'
+        print_timings(f'{label} parse',
+                      time_repeats(lambda: day16.get_packet(
+                          io.StringIO(transmission)), repeat),
+                      day16.version_sum(packet))
+        print_timings(f'{label} eval',
+                      time_repeats(packet.eval, repeat), packet.eval())
+
+
+def random_cave_map(num_small: int, num_big: int, seed: int = 0) -> str:
+    """
+    Builds a random day12 map in which each pair of caves other than two big
+    ones is connected with probability 1/2.
+    """
+    rng = random.Random(seed)
+    small = ['start', 'end'] + [f'c{i}' for i in range(num_small - 2)]
+    big = [f'C{i}' for i in range(num_big)]
+    caves = small + big
+
+    edges = [f'{a}-{b}'
+             for i, a in enumerate(caves) for b in caves[i+1:]
+             if (b in small or a in small) and rng.random() < 0.5]
+    return ''.join(edge + '\n' for edge in edges)
+
+
+@main.command()
+@click.option('-s', '--small', 'num_small', type=int, multiple=True,
+              default=(14,), show_default=True,
+              help='Number of small caves, including start and end; may be '
+              'repeated.')
+@click.option('-b', '--big', 'num_big', type=int, default=4,
+              show_default=True)
+@click.option('-r', '--repeat', default=3, show_default=True, type=int)
+def day12_paths(num_small: tuple[int, ...], num_big: int, repeat: int):
+    """
+    Times day12 path counting on random dense cave maps.
+    """
+    day12 = load_day(12)
+    for small in num_small:
+        cave_map = random_cave_map(small, num_big)
+        label = f'random {small}+{num_big} caves'
+        for part in ('part1', 'part2'):
+            print_timings(f'{label} {part}',
+                          time_repeats(partial(run_command, day12, [part],
+                                               cave_map.encode()), repeat),
+                          run_command(day12, [part], cave_map.encode()))
+
+
+if __name__ == '__main__':
+    main()
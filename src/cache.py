@@ -0,0 +1,213 @@
+from hashlib import sha256
+from pathlib import Path
+from typing import Iterator, Optional, Sequence
+import os
+import sys
+import tempfile
+import click
+
+DEFAULT_CACHE_DIR = Path(os.environ.get(
+    'AOC_CACHE_DIR', Path.home() / '.cache' / 'aoc2021'))
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+# Eviction frees this fraction of max_bytes beyond the bound, so that a full
+# cache is not scanned again on every put
+EVICT_TO_FRACTION = 0.75
+
+# Marks results still being written, which are not yet entries
+TMP_SUFFIX = '.tmp'
+
+
+class ResultCache:
+    """
+    On-disk store of command outputs, keyed on the day, the command line
+    passed to the day's group and a hash of the input bytes. Arguments
+    that name files, alone or as --option=FILE, also key on the files'
+    contents, so commands that read them are not answered from stale
+    entries.
+
+    Entries are evicted least-recently-used first (by mtime, which is
+    refreshed on every hit) once the total size exceeds max_bytes, down to
+    EVICT_TO_FRACTION of it. The total is found by scanning the cache once
+    per process and then kept up to date by each put, so the cache is only
+    scanned again when it looks full, and only once per many puts. Other
+    processes' puts are picked up at that scan.
+    """
+    root: Path
+    max_bytes: int
+    _size: Optional[int]
+
+    def __init__(
+        self,
+        root: Path = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES
+    ) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self._size = None
+
+    @staticmethod
+    def key(day: int, args: Sequence[str], data: bytes) -> str:
+        h = sha256()
+        h.update(f'day{day}\0'.encode())
+        for arg in args:
+            h.update(arg.encode() + b'\0')
+            for candidate in (arg, arg.partition('=')[2]):
+                if candidate and os.path.isfile(candidate):
+                    h.update(sha256(Path(candidate).read_bytes()).digest())
+        h.update(sha256(data).digest())
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _entry_paths(self) -> Iterator[Path]:
+        return (path for path in self.root.glob('*/*')
+                if path.suffix != TMP_SUFFIX)
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            res = path.read_text()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return res
+
+    def put(self, key: str, value: str):
+        path = self._path(key)
+        # evict() may remove the directory between mkdir() and mkstemp()
+        while True:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=TMP_SUFFIX)
+                break
+            except FileNotFoundError:
+                continue
+        with os.fdopen(fd, 'w') as f:
+            f.write(value)
+
+        if self._size is None:
+            self._size = self.size()
+        try:
+            self._size -= path.stat().st_size
+        except FileNotFoundError:
+            pass
+        self._size += os.stat(tmp).st_size
+        os.replace(tmp, path)
+
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def entries(self) -> list[os.stat_result]:
+        res: list[os.stat_result] = []
+        for path in self._entry_paths():
+            try:
+                res.append(path.stat())
+            except FileNotFoundError:
+                continue
+        return res
+
+    def size(self) -> int:
+        return sum(st.st_size for st in self.entries())
+
+    def _remove(self, path: Path):
+        path.unlink(missing_ok=True)
+        try:
+            path.parent.rmdir()
+        except OSError:
+            pass
+
+    def evict(self):
+        entries: list[tuple[float, int, Path]] = []
+        for path in self._entry_paths():
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            self._size = total
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes * EVICT_TO_FRACTION:
+                break
+            self._remove(path)
+            total -= size
+        self._size = total
+
+    def clear(self):
+        for path in self._entry_paths():
+            self._remove(path)
+        self._size = 0
+
+
+def solve(
+    day: int,
+    args: Sequence[str],
+    data: bytes,
+    cache: Optional[ResultCache]
+) -> str:
+    """
+    Runs a day's command on data, answering from the cache when possible.
+
+    The day module is only imported on a cache miss.
+    """
+    if cache is not None:
+        key = ResultCache.key(day, args, data)
+        if (res := cache.get(key)) is not None:
+            return res
+
+    from runner import load_day, run_command
+    res = run_command(load_day(day), args, data)
+
+    if cache is not None:
+        cache.put(key, res)
+    return res
+
+
+@click.group()
+@click.option('--cache-dir', type=click.Path(path_type=Path),
+              default=DEFAULT_CACHE_DIR, show_default=True)
+@click.option('--max-size', type=int, default=DEFAULT_MAX_BYTES,
+              show_default=True, help='Cache size bound in bytes.')
+@click.pass_context
+def main(ctx: click.Context, cache_dir: Path, max_size: int):
+    ctx.obj = ResultCache(cache_dir, max_size)
+
+
+@main.command(context_settings=dict(ignore_unknown_options=True))
+@click.option('--no-cache', is_flag=True,
+              help='Bypass the cache, neither reading nor storing results.')
+@click.argument('day', type=int)
+@click.argument('args', nargs=-1, type=click.UNPROCESSED)
+@click.pass_obj
+def run(cache: ResultCache, no_cache: bool, day: int, args: tuple[str, ...]):
+    """
+    Runs `dayDAY ARGS...` on stdin, e.g. `run 14 sim --steps 100`.
+    """
+    data = sys.stdin.buffer.read()
+    print(solve(day, args, data, None if no_cache else cache))
+
+
+@main.command()
+@click.pass_obj
+def stats(cache: ResultCache):
+    entries = cache.entries()
+    print(f'{len(entries)} entries, {sum(e.st_size for e in entries)} bytes '
+          f'(bound {cache.max_bytes}) in {cache.root}')
+
+
+@main.command()
+@click.pass_obj
+def clear(cache: ResultCache):
+    cache.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,8 +4,11 @@ from collections import deque
 from typing import Deque, Generator, Iterable
 import click
 
+from profiling import phase, profile_option
+
 
 @click.group()
+@profile_option
 def main():
     pass
 
@@ -21,7 +24,11 @@ def count_increases(inputs: Iterable[int]) -> int:
 
 @main.command()
 def part1():
-    print(count_increases(get_input()))
+    with phase('parse'):
+        inputs = list(get_input())
+    with phase('solve'):
+        res = count_increases(inputs)
+    print(res)
 
 
 def get_three_sums(inputs: Iterable[int]) -> Generator[int, None, None]:
@@ -37,7 +44,11 @@ def get_three_sums(inputs: Iterable[int]) -> Generator[int, None, None]:
 
 @main.command()
 def part2():
-    print(count_increases(get_three_sums(get_input())))
+    with phase('parse'):
+        inputs = list(get_input())
+    with phase('solve'):
+        res = count_increases(get_three_sums(inputs))
+    print(res)
 
 
 if __name__ == "__main__":
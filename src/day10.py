@@ -5,8 +5,11 @@ from dataclasses import dataclass
 from enum import Enum, auto
 from statistics import median_low
 
+from profiling import phase, profile_option
+
 
 @click.group()
+@profile_option
 def main(): pass
 
 
@@ -102,8 +105,12 @@ def syntax_error_score(s: str) -> Optional[int]:
 
 @main.command()
 def part1():
-    print(sum(filter(lambda x: x is not None,
-          (syntax_error_score(line.rstrip()) for line in sys.stdin))))
+    with phase('parse'):
+        lines = [line.rstrip() for line in sys.stdin]
+    with phase('solve'):
+        res = sum(filter(lambda x: x is not None,
+                  (syntax_error_score(line) for line in lines)))
+    print(res)
 
 
 def autocomplete_score(s: str) -> Optional[int]:
@@ -121,8 +128,12 @@ def autocomplete_score(s: str) -> Optional[int]:
 
 @main.command()
 def part2():
-    print(median_low(filter(lambda x: x is not None,
-          (autocomplete_score(line.rstrip()) for line in sys.stdin))))
+    with phase('parse'):
+        lines = [line.rstrip() for line in sys.stdin]
+    with phase('solve'):
+        res = median_low(filter(lambda x: x is not None,
+                         (autocomplete_score(line) for line in lines)))
+    print(res)
 
 
 if __name__ == '__main__':
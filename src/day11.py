@@ -1,9 +1,16 @@
+from abc import ABC, abstractmethod
+from enum import Enum
 from typing import Generator, TextIO, TypeAlias
 import click
 import sys
+import numpy as np
+
+from digitgrid import DigitGrid
+from profiling import phase, profile_option
 
 
 @click.group()
+@profile_option
 def main(): pass
 
 
@@ -11,6 +18,10 @@ Point: TypeAlias = tuple[int, int]
 
 FLASH_THRESHOLD = 10
 
+# Rounds of the numpy engine's cascade that flash fewer than this fraction
+# of the octopuses update just their neighbours rather than the whole grid
+SPARSE_ROUND_FRACTION = 64
+
 ADJ_DELTAS: list[Point] = [
     (-1, -1),
     (-1, 0),
@@ -23,26 +34,54 @@ ADJ_DELTAS: list[Point] = [
 ]
 
 
-def adjacent_points(r: int, c: int, size: int) -> Generator[Point, None, None]:
+def adjacent_points(
+    r: int,
+    c: int,
+    height: int,
+    width: int
+) -> Generator[Point, None, None]:
     for dr, dc in ADJ_DELTAS:
         adj_r = r + dr
         adj_c = c + dc
 
-        if 0 <= adj_r and adj_r < size and 0 <= adj_c and adj_c < size:
+        if 0 <= adj_r and adj_r < height and 0 <= adj_c and adj_c < width:
             yield (adj_r, adj_c)
 
 
-class OctopusGrid:
-    _levels: list[list[int]]
-    size: int
+class OctopusSim(ABC):
+    """
+    What both engines share: the grid's shape and the number of steps
+    taken. step() returns the number of flashes in the step.
+    """
+    height: int
+    width: int
     step_count: int = 0
 
-    def __init__(self, levels: list[list[int]]) -> None:
-        self._levels = levels
-        self.size = len(levels)
+    def __init__(self, height: int, width: int) -> None:
+        self.height = height
+        self.width = width
+
+    @property
+    def num_octopuses(self) -> int:
+        return self.height * self.width
+
+    @abstractmethod
+    def step(self) -> int: ...
+
+
+class OctopusGrid(OctopusSim):
+    _grid: DigitGrid
+    _levels: bytearray
+    _stride: int
+
+    def __init__(self, grid: DigitGrid) -> None:
+        super().__init__(grid.height, grid.width)
+        self._grid = grid
+        self._levels = grid.cells
+        self._stride = grid.stride
 
     def __str__(self) -> str:
-        return '\n'.join(''.join(str(v) for v in row) for row in self._levels)
+        return str(self._grid)
 
     def _incr_point(
         self,
@@ -51,14 +90,15 @@ class OctopusGrid:
         flash_q: list[Point],
         flash_set: set[Point]
     ):
-        self._levels[r][c] += 1
-        if (self._levels[r][c] >= FLASH_THRESHOLD and (r, c) not in flash_set):
+        idx = r * self._stride + c
+        self._levels[idx] += 1
+        if (self._levels[idx] >= FLASH_THRESHOLD and (r, c) not in flash_set):
             flash_set.add((r, c))
             flash_q.append((r, c))
 
     def _incr_all(self, flash_q: list[Point], flash_set: set[Point]):
-        for r in range(self.size):
-            for c in range(self.size):
+        for r in range(self.height):
+            for c in range(self.width):
                 self._incr_point(r, c, flash_q, flash_set)
 
     def _do_flash(
@@ -68,7 +108,7 @@ class OctopusGrid:
         flash_q: list[Point],
         flash_set: set[Point]
     ):
-        for adj_r, adj_c in adjacent_points(r, c, self.size):
+        for adj_r, adj_c in adjacent_points(r, c, self.height, self.width):
             self._incr_point(adj_r, adj_c, flash_q, flash_set)
 
     def step(self) -> int:
@@ -81,50 +121,146 @@ class OctopusGrid:
             self._do_flash(r, c, flash_q, flash_set)
 
         for (r, c) in flash_set:
-            self._levels[r][c] = 0
+            self._levels[r * self._stride + c] = 0
 
         self.step_count += 1
         return len(flash_set)
 
 
-def get_grid(inp: TextIO) -> OctopusGrid:
-    return OctopusGrid(list(list(int(v) for v in line.rstrip())
-                            for line in inp))
+class NumpyOctopusGrid(OctopusSim):
+    """
+    An octopus grid that steps every octopus at once with array operations.
+    Levels are kept surrounded by a border that is marked as flashed from
+    the start of each step, so it never flashes and edges need no checks.
+
+    While many octopuses flash in a round of the cascade, every level gains
+    the number of its neighbours that have just flashed, as a 3x3 box sum
+    of the new flashes. The cascade thins out into long tails of small
+    rounds, so once a round flashes fewer than 1 / SPARSE_ROUND_FRACTION of
+    the octopuses, only the neighbours of each new flash are updated.
+    """
+    _padded_levels: np.ndarray
+    _border: np.ndarray
+    _neighbor_offsets: list[int]
+
+    def __init__(self, grid: DigitGrid) -> None:
+        super().__init__(grid.height, grid.width)
+        padded_shape = (self.height + 2, self.width + 2)
+        self._padded_levels = np.zeros(padded_shape, dtype=np.uint8)
+        self._padded_levels[1:-1, 1:-1] = np.frombuffer(
+            grid.cells, dtype=np.uint8).reshape(self.height, self.width)
+        self._border = np.ones(padded_shape, dtype=bool)
+        self._border[1:-1, 1:-1] = False
+
+        stride = self.width + 2
+        self._neighbor_offsets = [dr * stride + dc for dr, dc in ADJ_DELTAS]
+
+    def __str__(self) -> str:
+        inner = self._padded_levels[1:-1, 1:-1]
+        return str(DigitGrid(bytearray(inner.tobytes()),
+                             self.height, self.width))
+
+    def step(self) -> int:
+        levels = self._padded_levels
+        inner = levels[1:-1, 1:-1]
+        inner += 1
+        flashed = self._border.copy()
+        new_flashes = levels >= FLASH_THRESHOLD
+        new_flashes &= ~flashed
+        flashed |= new_flashes
+
+        # An octopus counts itself, but it has flashed already and is reset,
+        # and levels stay below 20 as each neighbour flashes at most once
+        min_dense_flashes = self.num_octopuses // SPARSE_ROUND_FRACTION
+        while np.count_nonzero(new_flashes) > min_dense_flashes:
+            counts = new_flashes.view(np.uint8)
+            counts = counts[:, :-2] + counts[:, 1:-1] + counts[:, 2:]
+            inner += counts[:-2]
+            inner += counts[1:-1]
+            inner += counts[2:]
+
+            new_flashes = levels >= FLASH_THRESHOLD
+            new_flashes &= ~flashed
+            flashed |= new_flashes
+
+        # Flashes are marked as soon as they are found, so each is queued
+        # once even when several neighbours push it over the threshold
+        flat_levels = levels.ravel()
+        flat_flashed = flashed.ravel()
+        flash_idxs = np.flatnonzero(new_flashes)
+        while flash_idxs.size:
+            found: list[np.ndarray] = []
+            for offset in self._neighbor_offsets:
+                adj_idxs = flash_idxs + offset
+                flat_levels[adj_idxs] += 1
+                adj_idxs = adj_idxs[(flat_levels[adj_idxs] >= FLASH_THRESHOLD)
+                                    & ~flat_flashed[adj_idxs]]
+                flat_flashed[adj_idxs] = True
+                found.append(adj_idxs)
+            flash_idxs = np.concatenate(found)
+
+        # This also clears whatever the border picked up
+        levels[flashed] = 0
+        self.step_count += 1
+        return int(np.count_nonzero(flashed[1:-1, 1:-1]))
+
+
+class Engine(Enum):
+    SCALAR = 'scalar'
+    NUMPY = 'numpy'
+
+
+def get_grid(inp: TextIO, engine: str = Engine.SCALAR.value) -> OctopusSim:
+    grid = DigitGrid.load(inp)
+    if Engine(engine) == Engine.NUMPY:
+        return NumpyOctopusGrid(grid)
+    return OctopusGrid(grid)
+
+
+engine_option = click.option(
+    '--engine', type=click.Choice([engine.value for engine in Engine]),
+    default=Engine.SCALAR.value, show_default=True)
 
 
 @main.command()
 @click.option('--steps', default=100, type=int)
 @click.option('-v', is_flag=True)
-def part1(steps: int, v: bool):
-    grid = get_grid(sys.stdin)
+@engine_option
+def part1(steps: int, v: bool, engine: str):
+    with phase('parse'):
+        grid = get_grid(sys.stdin, engine)
     if v:
         print(grid)
         print()
 
     total_flashes = 0
-    for _ in range(steps):
-        total_flashes += grid.step()
+    with phase('solve'):
+        for _ in range(steps):
+            total_flashes += grid.step()
 
-        if v:
-            print(grid)
-            print()
+            if v:
+                print(grid)
+                print()
 
     print(total_flashes)
 
 
 @main.command()
 @click.option('-v', is_flag=True)
-def part2(v: bool):
-    grid = get_grid(sys.stdin)
+@engine_option
+def part2(v: bool, engine: str):
+    with phase('parse'):
+        grid = get_grid(sys.stdin, engine)
     if v:
         print(grid)
         print()
 
-    octopus_count = grid.size ** 2
-    while octopus_count != grid.step():
-        if v:
-            print(grid)
-            print()
+    with phase('solve'):
+        octopus_count = grid.num_octopuses
+        while octopus_count != grid.step():
+            if v:
+                print(grid)
+                print()
 
     print(grid.step_count)
 
@@ -1,11 +1,15 @@
 from collections import defaultdict
-from functools import cache
-from typing import Generator, TextIO, TypeAlias
+from dataclasses import dataclass
+from itertools import islice
+from typing import Generator, Iterator, Optional, TextIO, TypeAlias
 import click
 import sys
 
+from profiling import phase, profile_option
+
 
 @click.group()
+@profile_option
 def main(): pass
 
 
@@ -25,41 +29,244 @@ def is_small_cave(name: str) -> bool:
     return name[0].islower()
 
 
-def count_paths(map: Map, allow_revisit: bool):
-    @cache
-    def count_paths_recursive(
-        name: str,
-        small_visited: frozenset[str],
-        revisited: bool
-    ) -> int:
-        if name == 'end':
+@dataclass
+class CaveGraph:
+    """
+    A map compiled to integer cave ids. Small caves are numbered first, so
+    small cave i is bit 1 << i of a visited mask.
+    """
+    names: list[str]
+    num_small: int
+    start: int
+    end: int
+    adjacent: list[list[int]]
+    # For each small cave, (small cave, number of ways) for every small cave
+    # reachable in one move or through one big cave
+    small_moves: list[list[tuple[int, int]]]
+
+    @staticmethod
+    def compile(map: Map) -> "CaveGraph":
+        # A map missing start or end gets them as isolated caves, so that
+        # it has no paths
+        names = sorted(map.keys() | {'start', 'end'},
+                       key=lambda name: (not is_small_cave(name), name))
+        ids = {name: idx for idx, name in enumerate(names)}
+        num_small = sum(1 for name in names if is_small_cave(name))
+        adjacent = [[ids[succ] for succ in sorted(map.get(name, ()))]
+                    for name in names]
+
+        small_moves: list[list[tuple[int, int]]] = []
+        for cave in range(num_small):
+            ways: dict[int, int] = defaultdict(int)
+            for succ in adjacent[cave]:
+                if succ < num_small:
+                    ways[succ] += 1
+                    continue
+                for big_succ in adjacent[succ]:
+                    if big_succ >= num_small:
+                        raise ValueError(
+                            f'big caves {names[succ]} and {names[big_succ]} '
+                            'are adjacent, so there are infinitely many '
+                            'paths')
+                    ways[big_succ] += 1
+            small_moves.append(sorted(ways.items()))
+
+        return CaveGraph(names, num_small, ids['start'], ids['end'],
+                         adjacent, small_moves)
+
+
+def enter_cave(
+    graph: CaveGraph,
+    cave: int,
+    visited: int,
+    revisits_left: int
+) -> Optional[tuple[int, int]]:
+    """
+    Returns the visited mask and revisit budget after moving into cave, or
+    None if the move is not allowed.
+    """
+    if cave >= graph.num_small:
+        return (visited, revisits_left)
+    elif cave == graph.start:
+        return None
+    elif not visited >> cave & 1:
+        return (visited | 1 << cave, revisits_left)
+    elif revisits_left:
+        return (visited, revisits_left - 1)
+    return None
+
+
+class PathCounter:
+    """
+    Counts the paths to end from a small cave just entered, given the small
+    caves visited so far as a mask and the number of revisits left. Moves
+    between small caves are taken directly or through one big cave.
+    """
+    graph: CaveGraph
+    revisits: int
+    # Path counts keyed on (visited, cave, revisits left) packed into one
+    # int, which hashes faster than a tuple
+    _memo: dict[int, int]
+    _cave_bits: int
+    # Start is never reentered and end always finishes a path, so moves to
+    # them are left out of _moves and counted in _end_ways
+    _moves: list[list[tuple[int, int]]]
+    _end_ways: list[int]
+
+    def __init__(self, graph: CaveGraph, revisits: int) -> None:
+        self.graph = graph
+        self.revisits = revisits
+        self._memo = {}
+        self._cave_bits = graph.num_small.bit_length()
+
+        self._end_ways = [0] * graph.num_small
+        self._moves = []
+        for cave, cave_moves in enumerate(graph.small_moves):
+            self._moves.append([])
+            for succ, ways in cave_moves:
+                if succ == graph.end:
+                    self._end_ways[cave] = ways
+                elif succ != graph.start:
+                    self._moves[cave].append((succ, ways))
+
+    def count(self, cave: int, visited: int, revisits_left: int) -> int:
+        if cave == self.graph.end:
             return 1
-        elif name == 'start' and revisited:
+
+        memo = self._memo
+        cave_bits = self._cave_bits
+        budget = self.revisits + 1
+
+        def count_from(cave: int, visited: int, revisits_left: int) -> int:
+            total = self._end_ways[cave]
+            for succ, ways in self._moves[cave]:
+                if not visited >> succ & 1:
+                    succ_visited = visited | 1 << succ
+                    succ_left = revisits_left
+                elif revisits_left:
+                    succ_visited = visited
+                    succ_left = revisits_left - 1
+                else:
+                    continue
+
+                # Lookups happen before recursing, so each state costs one
+                # call
+                key = (succ_visited << cave_bits | succ) * budget + succ_left
+                if (res := memo.get(key)) is None:
+                    res = memo[key] = count_from(succ, succ_visited,
+                                                 succ_left)
+                total += ways * res
+            return total
+
+        key = (visited << cave_bits | cave) * budget + revisits_left
+        if (res := memo.get(key)) is None:
+            res = memo[key] = count_from(cave, visited, revisits_left)
+        return res
+
+    def count_move(self, cave: int, visited: int, revisits_left: int) -> int:
+        """
+        Counts the paths that continue by moving into cave, of any size.
+        """
+        if (entered := enter_cave(self.graph, cave, visited,
+                                  revisits_left)) is None:
             return 0
+        if cave < self.graph.num_small:
+            return self.count(cave, *entered)
+        return sum(self.count_move(succ, visited, revisits_left)
+                   for succ in self.graph.adjacent[cave])
+
+
+def count_paths(graph: CaveGraph, revisits: int = 0) -> int:
+    """
+    Counts the paths from start to end that enter small caves already
+    visited at most revisits times in total.
+    """
+    return PathCounter(graph, revisits).count(graph.start,
+                                              1 << graph.start, revisits)
+
+
+def iter_paths(
+    graph: CaveGraph,
+    revisits: int = 0,
+    offset: int = 0
+) -> Generator[list[str], None, None]:
+    """
+    Yields the paths counted by count_paths one at a time, in lexicographic
+    order of cave names, starting from the path at index offset.
+
+    Only the current path is held, and whole subtrees of paths before offset
+    are skipped by their counts, so any page of paths is reached quickly.
+    """
+    counter = PathCounter(graph, revisits)
+    path = [graph.start]
+    # Successors still to try after each cave on the path, with the visited
+    # mask and revisit budget on entering it
+    stack: list[tuple[Iterator[int], int, int]] = [
+        (iter(graph.adjacent[graph.start]), 1 << graph.start, revisits)]
 
-        if is_small_cave(name):
-            small_visited |= set((name,))
+    while stack:
+        succs, visited, revisits_left = stack[-1]
+        for succ in succs:
+            if (entered := enter_cave(graph, succ, visited,
+                                      revisits_left)) is None:
+                continue
+            if offset:
+                if (num_paths := counter.count_move(
+                        succ, visited, revisits_left)) <= offset:
+                    offset -= num_paths
+                    continue
 
-        total = sum(count_paths_recursive(succ, small_visited, revisited)
-                    for succ in map[name] if succ not in small_visited)
+            if succ == graph.end:
+                yield [graph.names[cave] for cave in path + [succ]]
+                continue
 
-        if allow_revisit and not revisited:
-            total += sum(count_paths_recursive(succ, small_visited, True)
-                         for succ in map[name] & small_visited)
+            path.append(succ)
+            stack.append((iter(graph.adjacent[succ]), *entered))
+            break
+        else:
+            stack.pop()
+            path.pop()
 
-        return total
 
-    return count_paths_recursive('start', frozenset(), False)
+def solve(revisits: int) -> int:
+    with phase('parse'):
+        graph = CaveGraph.compile(get_map(sys.stdin))
+    with phase('solve'):
+        return count_paths(graph, revisits)
 
 
 @main.command()
 def part1():
-    print(count_paths(get_map(sys.stdin), allow_revisit=False))
+    print(solve(revisits=0))
 
 
 @main.command()
 def part2():
-    print(count_paths(get_map(sys.stdin), allow_revisit=True))
+    print(solve(revisits=1))
+
+
+@main.command()
+@click.option('-k', '--revisits', type=int, default=1, show_default=True,
+              help='Total number of times small caves may be reentered.')
+def count(revisits: int):
+    print(solve(revisits))
+
+
+@main.command()
+@click.option('-k', '--revisits', type=int, default=1, show_default=True,
+              help='Total number of times small caves may be reentered.')
+@click.option('--offset', type=int, default=0, show_default=True,
+              help='Index of the first path to print.')
+@click.option('--limit', type=int, help='Maximum number of paths to print.')
+def paths(revisits: int, offset: int, limit: Optional[int]):
+    """
+    Prints paths in lexicographic order, one per line.
+    """
+    with phase('parse'):
+        graph = CaveGraph.compile(get_map(sys.stdin))
+    with phase('solve'):
+        for path in islice(iter_paths(graph, revisits, offset), limit):
+            print(','.join(path))
 
 
 if __name__ == '__main__':
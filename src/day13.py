@@ -3,8 +3,11 @@ from typing import Sequence, TextIO, TypeAlias
 import click
 import sys
 
+from profiling import phase, profile_option
+
 
 @click.group()
+@profile_option
 def main(): pass
 
 
@@ -53,9 +56,11 @@ def apply_fold(paper: Paper, fold: Fold) -> Paper:
 
 @main.command()
 def part1():
-    paper, fold_seq = get_input(sys.stdin)
+    with phase('parse'):
+        paper, fold_seq = get_input(sys.stdin)
 
-    paper = apply_fold(paper, fold_seq[0])
+    with phase('solve'):
+        paper = apply_fold(paper, fold_seq[0])
     print(len(paper))
 
 
@@ -73,9 +78,12 @@ def pretty_print(paper: Paper):
 
 @main.command()
 def part2():
-    paper, fold_seq = get_input(sys.stdin)
-    for fold in fold_seq:
-        paper = apply_fold(paper, fold)
+    with phase('parse'):
+        paper, fold_seq = get_input(sys.stdin)
+
+    with phase('solve'):
+        for fold in fold_seq:
+            paper = apply_fold(paper, fold)
 
     pretty_print(paper)
 
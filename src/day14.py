@@ -1,30 +1,115 @@
-from collections import defaultdict
-from itertools import pairwise
-from typing import TextIO, TypeAlias
+from functools import lru_cache
+from heapq import merge
+from itertools import groupby, pairwise
+from random import Random
+from typing import Generator, Iterable, Optional, Sequence, TextIO, TypeAlias
+import json
 import click
 import sys
 
+from profiling import phase, profile_option
+
 Rules: TypeAlias = dict[str, str]
 
+# Coefficients of a polynomial, lowest power first
+Polynomial: TypeAlias = list[int]
+
+MERSENNE_PRIMES = [(1 << e) - 1 for e in (
+    61, 89, 107, 127, 521, 607, 1279, 2203, 2281, 3217, 4253, 4423, 9689,
+    9941, 11213, 19937, 21701, 23209, 44497)]
+
 
 @click.group()
+@profile_option
 def main(): pass
 
 
 class PolymerString:
-    def __init__(self, s: str):
-        self.elem_counts: dict[str, int] = defaultdict(int)
-        self.pair_counts: dict[str, int] = defaultdict(int)
+    """
+    A polymer as the count of each adjacent pair of elements. Elements are
+    numbered by their position in elements, and the pair (a, b) is counted
+    at pair_counts[a * len(elements) + b].
+    """
+    elements: list[str]
+    pair_counts: list[int]
+    # Insertions never change the last element, which completes the element
+    # counts given by the first element of each pair
+    last: int
 
-        for c in s:
-            self.elem_counts[c] += 1
+    def __init__(self, s: str, elements: Sequence[str]):
+        self.elements = list(elements)
+        idxs = {elem: idx for idx, elem in enumerate(self.elements)}
+        num_elems = len(self.elements)
 
+        self.pair_counts = [0] * (num_elems * num_elems)
         for a, b in pairwise(s):
-            self.pair_counts[a+b] += 1
+            self.pair_counts[idxs[a] * num_elems + idxs[b]] += 1
+        self.last = idxs[s[-1]] if s else -1
+
+    def get_elem_counts(self) -> dict[str, int]:
+        num_elems = len(self.elements)
+        counts = [0] * num_elems
+        for pair, count in enumerate(self.pair_counts):
+            counts[pair // num_elems] += count
+        if self.last >= 0:
+            counts[self.last] += 1
+
+        return {elem: count
+                for elem, count in zip(self.elements, counts) if count}
+
+
+class InsertionMatrix:
+    """
+    The linear map from a polymer's pair counts to those after one step,
+    stored sparsely as one (source pair, destination pair) entry per unit
+    coefficient: a pair with a rule feeds the two pairs it becomes, and any
+    other pair feeds itself.
+    """
+    size: int
+    entries: list[tuple[int, int]]
+
+    def __init__(self, rules: Rules, elements: Sequence[str]):
+        idxs = {elem: idx for idx, elem in enumerate(elements)}
+        num_elems = len(elements)
+        self.size = num_elems * num_elems
+        self.entries = []
+
+        for a in range(num_elems):
+            for b in range(num_elems):
+                pair = a * num_elems + b
+                if (out := rules.get(elements[a] + elements[b])) is None:
+                    self.entries.append((pair, pair))
+                else:
+                    self.entries.append((pair, a * num_elems + idxs[out]))
+                    self.entries.append((pair, idxs[out] * num_elems + b))
+
+    def apply(self, counts: Sequence[int]) -> list[int]:
+        res = [0] * self.size
+        for src, dst in self.entries:
+            res[dst] += counts[src]
+        return res
+
+    def num_reachable(self, counts: Sequence[int]) -> int:
+        """
+        Returns the number of pairs that can ever be counted starting from
+        counts, which bounds the degree of the recurrence they satisfy.
+        """
+        successors: list[list[int]] = [[] for _ in range(self.size)]
+        for src, dst in self.entries:
+            successors[src].append(dst)
+
+        reached = {pair for pair, count in enumerate(counts) if count}
+        frontier = list(reached)
+        while frontier:
+            for dst in successors[frontier.pop()]:
+                if dst not in reached:
+                    reached.add(dst)
+                    frontier.append(dst)
+        return len(reached)
 
 
-def get_input(inp: TextIO) -> tuple[PolymerString, Rules]:
-    s = PolymerString(inp.readline().rstrip())
+def get_input(inp: TextIO) -> tuple[PolymerString, InsertionMatrix]:
+    template = inp.readline().rstrip()
     inp.readline()
 
     rules: Rules = Rules()
@@ -32,36 +117,256 @@ def get_input(inp: TextIO) -> tuple[PolymerString, Rules]:
         in_pair, out = line.rstrip().split(' -> ')
         rules[in_pair] = out
 
-    return (s, rules)
+    elements = sorted(set(template).union(*rules, *rules.values()))
+    return (PolymerString(template, elements),
+            InsertionMatrix(rules, elements))
 
 
-def step(s: PolymerString, rules: Rules):
-    new_pair_counts: dict[str, int] = s.pair_counts.copy()
-    for pair, count in s.pair_counts.items():
-        if (out := rules.get(pair)) is None:
+def step(s: PolymerString, matrix: InsertionMatrix):
+    s.pair_counts = matrix.apply(s.pair_counts)
+
+
+def min_polynomial(seq: Sequence[int], modulus: int) -> Polynomial:
+    """
+    Returns the shortest monic P such that sum(P[i] * seq[n + i]) == 0 for
+    every n, found with the Berlekamp-Massey algorithm modulo a prime. This
+    is only guaranteed for a sequence twice as long as the recurrence.
+
+    Coefficients are lifted to the range (-modulus / 2, modulus / 2), so the
+    result is exact when its true coefficients lie in that range.
+    """
+    conn = [1]
+    prev = [1]
+    length = 0
+    shift = 1
+    prev_discrepancy = 1
+
+    for n, val in enumerate(seq):
+        discrepancy = (val + sum(conn[i] * seq[n - i]
+                                 for i in range(1, length + 1))) % modulus
+        if not discrepancy:
+            shift += 1
             continue
 
-        new_pair_counts[pair] -= count
-        new_pair_counts[pair[0] + out] += count
-        new_pair_counts[out + pair[1]] += count
-        s.elem_counts[out] += count
+        scale = discrepancy * pow(prev_discrepancy, -1, modulus) % modulus
+        updated = conn + [0] * max(0, len(prev) + shift - len(conn))
+        for i, coeff in enumerate(prev):
+            updated[i + shift] = (updated[i + shift] - scale * coeff) % modulus
 
-    s.pair_counts = new_pair_counts
+        if 2 * length <= n:
+            prev, prev_discrepancy = conn, discrepancy
+            length = n + 1 - length
+            shift = 1
+        else:
+            shift += 1
+        conn = updated
 
+    conn += [0] * (length + 1 - len(conn))
+    half = modulus // 2
+    return [coeff - modulus if coeff > half else coeff
+            for coeff in reversed(conn[:length + 1])]
+
+
+def _mul_mod(a: Polynomial, b: Polynomial, m: Polynomial) -> Polynomial:
+    """
+    Returns a * b reduced modulo the monic polynomial m. Squares take about
+    half the multiplications.
+    """
+    degree = len(m) - 1
+    res = [0] * (len(a) + len(b) - 1)
+    if a is b:
+        for i, x in enumerate(a):
+            if not x:
+                continue
+            res[2 * i] += x * x
+            for j in range(i + 1, len(a)):
+                if (y := a[j]):
+                    res[i + j] += (x * y) << 1
+    else:
+        for i, x in enumerate(a):
+            if x:
+                for j, y in enumerate(b):
+                    res[i + j] += x * y
+
+    for k in range(len(res) - 1, degree - 1, -1):
+        if (coeff := res[k]):
+            for i in range(degree):
+                res[k - degree + i] -= coeff * m[i]
+    return res[:degree]
+
+
+def _power_mod(n: int, m: Polynomial) -> Polynomial:
+    """
+    Returns x^n reduced modulo the monic polynomial m.
+    """
+    res = _mul_mod([1], [1], m)
+    x = _mul_mod([0, 1], [1], m)
+    for bit in f'{n:b}':
+        res = _mul_mod(res, res, m)
+        if bit == '1':
+            res = _mul_mod(res, x, m)
+    return res
+
+
+def find_recurrence(
+    s: PolymerString,
+    matrix: InsertionMatrix
+) -> Optional[tuple[Polynomial, list[list[int]]]]:
+    """
+    Returns (P, states), where states are the pair counts of s after 0, 1,
+    ... steps, twice as many as the number of reachable pairs, and P is the
+    recurrence they satisfy. Returns None if no recurrence was confirmed.
+
+    With M the insertion matrix and v the pair counts, the vectors M^n v
+    satisfy a linear recurrence whose polynomial P has degree at most the
+    number of reachable pairs. Then M^n v = R(M) v, where R is x^n reduced
+    modulo P, so every later state is a combination of these.
+    """
+    bound = matrix.num_reachable(s.pair_counts)
+    states = [s.pair_counts]
+    for _ in range(2 * bound - 1):
+        states.append(matrix.apply(states[-1]))
+
+    # The recurrence of a random projection of the states is almost always
+    # that of the states themselves. Its roots are eigenvalues of M, which
+    # are at most 2 in magnitude as each pair feeds at most two, so its
+    # coefficients are at most 3^bound in magnitude.
+    rng = Random(0)
+    for modulus in MERSENNE_PRIMES:
+        if modulus <= 2 * 3 ** bound:
+            continue
+        weights = [rng.randrange(modulus) for _ in range(matrix.size)]
+        poly = min_polynomial(
+            [sum(w * count for w, count in zip(weights, st)) % modulus
+             for st in states], modulus)
+        if not any(sum(coeff * st[pair] for coeff, st in zip(poly, states))
+                   for pair in range(matrix.size)):
+            return (poly, states)
+    return None
+
+
+def _combine(coeffs: Polynomial, states: list[list[int]]) -> list[int]:
+    """
+    Returns the sum of coeffs[i] * states[i], pair by pair.
+    """
+    return [sum(coeff * st[pair] for coeff, st in zip(coeffs, states) if coeff)
+            for pair in range(len(states[0]))]
+
+
+def advance(s: PolymerString, matrix: InsertionMatrix, steps: int):
+    """
+    Equivalent to calling step() steps times, in O(log steps) polynomial
+    products once the recurrence of s is found.
+    """
+    if steps > 2 * matrix.num_reachable(s.pair_counts):
+        if (recurrence := find_recurrence(s, matrix)) is not None:
+            poly, states = recurrence
+            s.pair_counts = _combine(_power_mod(steps, poly), states)
+            return
 
-def do_sim(steps: int):
-    s, rules = get_input(sys.stdin)
     for _ in range(steps):
-        step(s, rules)
-    print(max(s.elem_counts.values()) - min(s.elem_counts.values()))
+        step(s, matrix)
+
+
+def iter_elem_counts(
+    s: PolymerString,
+    matrix: InsertionMatrix,
+    checkpoints: Iterable[int]
+) -> Generator[tuple[int, dict[str, int]], None, None]:
+    """
+    Yields (step, element counts) at each of the non-decreasing checkpoints,
+    advancing s in place between them.
+
+    The recurrence is found once, from the initial state, and each
+    checkpoint's state is combined from the initial states it keeps. Only
+    x^checkpoint modulo the recurrence is carried between checkpoints, so
+    checkpoints may be an unbounded iterator.
+    """
+    if (recurrence := find_recurrence(s, matrix)) is None:
+        current = 0
+        for checkpoint in checkpoints:
+            if checkpoint < current:
+                raise ValueError('checkpoints must be non-decreasing')
+            for _ in range(checkpoint - current):
+                step(s, matrix)
+            current = checkpoint
+            yield (current, s.get_elem_counts())
+        return
+
+    poly, states = recurrence
+
+    # Checkpoints are usually evenly spaced, so few gaps recur
+    @lru_cache(maxsize=64)
+    def gap_power(gap: int) -> Polynomial:
+        return _power_mod(gap, poly)
+
+    current = 0
+    coeffs = _power_mod(0, poly)
+    for checkpoint in checkpoints:
+        if checkpoint < current:
+            raise ValueError('checkpoints must be non-decreasing')
+        if checkpoint > current:
+            coeffs = _mul_mod(coeffs, gap_power(checkpoint - current), poly)
+            current = checkpoint
+            s.pair_counts = (states[current] if current < len(states)
+                             else _combine(coeffs, states))
+        yield (current, s.get_elem_counts())
+
+
+def get_spread(elem_counts: dict[str, int]) -> int:
+    return max(elem_counts.values()) - min(elem_counts.values())
+
+
+def do_sim(steps: int):
+    with phase('parse'):
+        s, matrix = get_input(sys.stdin)
+    with phase('solve'):
+        advance(s, matrix, steps)
+        elem_counts = s.get_elem_counts()
+    print(get_spread(elem_counts))
 
 
 @main.command()
 @click.option('--steps', type=int, required=True)
 def sim(steps: int):
+    if hasattr(sys, 'set_int_max_str_digits'):
+        sys.set_int_max_str_digits(0)
     do_sim(steps)
 
 
+@main.command()
+@click.option('--at', 'at', type=int, multiple=True,
+              help='Step count to report; may be repeated.')
+@click.option('--every', type=int,
+              help='Report every EVERY steps, up to --steps.')
+@click.option('--steps', type=int,
+              help='Last step count to report with --every.')
+def checkpoints(at: tuple[int, ...], every: Optional[int],
+                steps: Optional[int]):
+    """
+    Writes the element counts at each checkpoint as one JSON line, in a
+    single run of the simulation.
+    """
+    stops: Iterable[int] = sorted(set(at))
+    if every is not None:
+        if steps is None or every <= 0:
+            raise click.UsageError('--every needs --steps and must be > 0')
+        stops = (stop for stop, _ in groupby(
+            merge(stops, range(0, steps + 1, every))))
+    elif not at:
+        raise click.UsageError('give --at or --every')
+
+    if hasattr(sys, 'set_int_max_str_digits'):
+        sys.set_int_max_str_digits(0)
+    with phase('parse'):
+        s, matrix = get_input(sys.stdin)
+    with phase('solve'):
+        for step_num, elem_counts in iter_elem_counts(s, matrix, stops):
+            click.echo(json.dumps({'step': step_num,
+                                   'counts': elem_counts,
+                                   'spread': get_spread(elem_counts)}))
+
+
 @main.command()
 def part1():
     do_sim(10)
@@ -1,23 +1,65 @@
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from enum import Enum
 from heapq import heappush, heappop
-from typing import Generator, Optional, TextIO, TypeAlias
+from multiprocessing.shared_memory import SharedMemory
+from typing import (Callable, Generator, Optional, Sequence, TextIO,
+                    TypeAlias, cast)
 import click
 import sys
 
-Grid: TypeAlias = list[list[int]]
+from digitgrid import DigitGrid
+from profiling import phase, profile_option
+
+MAX_RISK = 9
+UNREACHED = 2 ** 63 - 1
+
+
+class TiledGrid:
+    """
+    A base grid repeated tiles times in each direction, where each tile's
+    risks are one higher (wrapping from 9 back to 1) than those of the tile
+    above or to the left of it.
+
+    Risks are computed on access, so the tiling costs no extra memory.
+    Indexing matches DigitGrid: cell (r, c) is cells[r * stride + c].
+    """
+    base: DigitGrid
+    tiles: int
+    height: int
+    width: int
+    stride: int
+    cells: "TiledGrid"
+
+    def __init__(self, base: DigitGrid, tiles: int) -> None:
+        self.base = base
+        self.tiles = tiles
+        self.height = tiles * base.height
+        self.width = tiles * base.width
+        self.stride = self.width
+        self.cells = self
+
+    def __getitem__(self, idx: int) -> int:
+        base = self.base
+        r, c = divmod(idx, self.stride)
+        tile_r, base_r = divmod(r, base.height)
+        tile_c, base_c = divmod(c, base.width)
+        risk = base.cells[base_r * base.stride + base_c]
+        return (risk + tile_r + tile_c - 1) % MAX_RISK + 1
+
+
+Grid: TypeAlias = DigitGrid | TiledGrid
 
 
 @click.group()
+@profile_option
 def main(): pass
 
 
-def get_grid(inp: TextIO) -> Grid:
-    res: Grid = []
-    for line in inp:
-        row: list[int] = []
-        for c in line.rstrip():
-            row.append(int(c))
-        res.append(row)
-    return res
+def get_grid(inp: TextIO) -> DigitGrid:
+    return DigitGrid.load(inp)
 
 
 def adjacent(
@@ -36,38 +78,344 @@ def adjacent(
         yield (r, c+1)
 
 
-def get_min_risk(grid: Grid) -> int:
-    height = len(grid)
-    width = len(grid[0])
+Point: TypeAlias = tuple[int, int]
+
+
+@dataclass
+class SearchStats:
+    expanded: int = 0
+
+
+def adjacent_idxs(
+    idx: int,
+    height: int,
+    width: int,
+    stride: int
+) -> tuple[int, ...]:
+    r, c = divmod(idx, stride)
+    if 0 < r < height-1 and 0 < c < width-1:
+        return (idx - stride, idx - 1, idx + stride, idx + 1)
+    return tuple(adj_r * stride + adj_c
+                 for adj_r, adj_c in adjacent(r, c, height, width))
+
+
+def _heap_min_risk(
+    grid: Grid,
+    source: Point,
+    target: Point,
+    stats: SearchStats
+) -> int:
+    height = grid.height
+    width = grid.width
+    stride = grid.stride
+    cells = grid.cells
 
     node_q: list[tuple[int, int, int]] = []
     visited: set[tuple[int, int]] = set()
     min_cost: dict[tuple[int, int], Optional[int]] = {}
 
-    heappush(node_q, (0, 0, 0))
-    visited.add((0, 0))
-    while True:
+    heappush(node_q, (0, *source))
+    while node_q:
         cost, r, c = heappop(node_q)
+        if (r, c) in visited:
+            continue
         visited.add((r, c))
-        if r == height-1 and c == width-1:
+        stats.expanded += 1
+        if (r, c) == target:
             return cost
 
         for (r, c) in adjacent(r, c, height, width):
             if (r, c) in visited:
                 continue
 
-            new_cost = cost + grid[r][c]
+            new_cost = cost + cells[r * stride + c]
             if ((prev_cost := min_cost.get((r, c))) is None
                     or new_cost < prev_cost):
                 heappush(node_q, (new_cost, r, c))
                 min_cost[(r, c)] = new_cost
 
+    raise ValueError('target is unreachable')
 
-@ main.command()
-def part1():
-    grid = get_grid(sys.stdin)
 
-    print(get_min_risk(grid))
+def _dial_costs(
+    grid: Grid,
+    source_idx: int,
+    target_idxs: Optional[set[int]],
+    stats: SearchStats
+) -> array:
+    """
+    Dijkstra over flat cell indices using a circular array of buckets, one
+    per distinct tentative cost in [cost, cost + MAX_RISK].
+
+    Returns the cost of every cell, stopping early once all of target_idxs
+    (if given) are settled.
+    """
+    height = grid.height
+    width = grid.width
+    stride = grid.stride
+    cells = grid.cells
+    remaining = None if target_idxs is None else set(target_idxs)
+
+    min_cost = array('q', [UNREACHED]) * (height * stride)
+    buckets: list[list[int]] = [[] for _ in range(MAX_RISK + 1)]
+    num_buckets = len(buckets)
+
+    min_cost[source_idx] = 0
+    buckets[0].append(source_idx)
+    pending = 1
+    cost = 0
+    while pending > 0:
+        bucket = buckets[cost % num_buckets]
+        while bucket:
+            idx = bucket.pop()
+            pending -= 1
+            if min_cost[idx] != cost:
+                continue
+            stats.expanded += 1
+            if remaining is not None and idx in remaining:
+                remaining.remove(idx)
+                if not remaining:
+                    return min_cost
+
+            # Inlined interior case of adjacent_idxs, as this is the hot loop
+            r, c = divmod(idx, stride)
+            if 0 < r < height-1 and 0 < c < width-1:
+                adj_idxs: tuple[int, ...] = (
+                    idx - stride, idx - 1, idx + stride, idx + 1)
+            else:
+                adj_idxs = adjacent_idxs(idx, height, width, stride)
+
+            for adj in adj_idxs:
+                new_cost = cost + cells[adj]
+                if new_cost < min_cost[adj]:
+                    min_cost[adj] = new_cost
+                    buckets[new_cost % num_buckets].append(adj)
+                    pending += 1
+        cost += 1
+
+    return min_cost
+
+
+def _dial_min_risk(
+    grid: Grid,
+    source: Point,
+    target: Point,
+    stats: SearchStats
+) -> int:
+    target_idx = target[0] * grid.stride + target[1]
+    cost = _dial_costs(grid, source[0] * grid.stride + source[1],
+                       {target_idx}, stats)[target_idx]
+    if cost == UNREACHED:
+        raise ValueError('target is unreachable')
+    return cost
+
+
+def _astar_min_risk(
+    grid: Grid,
+    source: Point,
+    target: Point,
+    stats: SearchStats
+) -> int:
+    """
+    A* with the Manhattan distance to the target as the heuristic, which is
+    admissible and consistent because every step costs at least 1.
+
+    Along an edge the estimate f = cost + heuristic grows by between 0 and
+    MAX_RISK + 1, so the queue is a circular array of buckets as in
+    _dial_min_risk.
+    """
+    height = grid.height
+    width = grid.width
+    stride = grid.stride
+    cells = grid.cells
+    target_r, target_c = target
+    source_idx = source[0] * stride + source[1]
+    target_idx = target_r * stride + target_c
+
+    def heuristic(idx: int) -> int:
+        r, c = divmod(idx, stride)
+        return abs(r - target_r) + abs(c - target_c)
+
+    min_cost = array('q', [UNREACHED]) * (height * stride)
+    buckets: list[list[int]] = [[] for _ in range(MAX_RISK + 2)]
+    num_buckets = len(buckets)
+
+    min_cost[source_idx] = 0
+    estimate = heuristic(source_idx)
+    buckets[estimate % num_buckets].append(source_idx)
+    pending = 1
+    while pending > 0:
+        bucket = buckets[estimate % num_buckets]
+        while bucket:
+            idx = bucket.pop()
+            pending -= 1
+            cost = min_cost[idx]
+            if cost + heuristic(idx) != estimate:
+                continue
+            stats.expanded += 1
+            if idx == target_idx:
+                return cost
+
+            for adj in adjacent_idxs(idx, height, width, stride):
+                new_cost = cost + cells[adj]
+                if new_cost < min_cost[adj]:
+                    min_cost[adj] = new_cost
+                    buckets[(new_cost + heuristic(adj)) % num_buckets].append(
+                        adj)
+                    pending += 1
+        estimate += 1
+
+    raise ValueError('target is unreachable')
+
+
+def _bidirectional_min_risk(
+    grid: Grid,
+    source: Point,
+    target: Point,
+    stats: SearchStats
+) -> int:
+    """
+    Dijkstra run forwards from the source and backwards from the target,
+    stopping once the two frontiers can no longer improve on the best path
+    seen through a cell reached by both.
+
+    Entering a cell costs its risk, so going backwards from a cell to one of
+    its neighbours costs the risk of the cell being left.
+    """
+    height = grid.height
+    width = grid.width
+    stride = grid.stride
+    cells = grid.cells
+    source_idx = source[0] * stride + source[1]
+    target_idx = target[0] * stride + target[1]
+    if source_idx == target_idx:
+        return 0
+
+    fwd_cost = array('q', [UNREACHED]) * (height * stride)
+    bwd_cost = array('q', [UNREACHED]) * (height * stride)
+    fwd_done = bytearray(height * stride)
+    bwd_done = bytearray(height * stride)
+    fwd_q: list[tuple[int, int]] = [(0, source_idx)]
+    bwd_q: list[tuple[int, int]] = [(0, target_idx)]
+    fwd_cost[source_idx] = 0
+    bwd_cost[target_idx] = 0
+    best = UNREACHED
+
+    while fwd_q and bwd_q and fwd_q[0][0] + bwd_q[0][0] < best:
+        forwards = fwd_q[0][0] <= bwd_q[0][0]
+        if forwards:
+            q, cost_to, done, cost_from = fwd_q, fwd_cost, fwd_done, bwd_cost
+        else:
+            q, cost_to, done, cost_from = bwd_q, bwd_cost, bwd_done, fwd_cost
+
+        cost, idx = heappop(q)
+        if done[idx]:
+            continue
+        done[idx] = 1
+        stats.expanded += 1
+
+        step = 0 if forwards else cells[idx]
+        for adj in adjacent_idxs(idx, height, width, stride):
+            new_cost = cost + (cells[adj] if forwards else step)
+            if new_cost < cost_to[adj]:
+                cost_to[adj] = new_cost
+                heappush(q, (new_cost, adj))
+                if cost_from[adj] != UNREACHED:
+                    best = min(best, new_cost + cost_from[adj])
+
+    if best == UNREACHED:
+        raise ValueError('target is unreachable')
+    return best
+
+
+class Engine(Enum):
+    HEAP = 'heap'
+    DIAL = 'dial'
+    ASTAR = 'astar'
+    BIDIRECTIONAL = 'bidir'
+
+
+def get_min_risk(
+    grid: Grid,
+    engine: Engine = Engine.HEAP,
+    source: Point = (0, 0),
+    target: Optional[Point] = None,
+    stats: Optional[SearchStats] = None
+) -> int:
+    """
+    Returns the lowest total risk of a path from source to target (by
+    default the top left and bottom right corners), where the risk of the
+    source itself is not counted.
+
+    If stats is given, the number of cells expanded is added to it.
+    """
+    if target is None:
+        target = (grid.height-1, grid.width-1)
+    for r, c in (source, target):
+        if not (0 <= r < grid.height and 0 <= c < grid.width):
+            raise ValueError(f'{(r, c)} is outside the grid')
+    if stats is None:
+        stats = SearchStats()
+
+    match engine:
+        case Engine.HEAP:
+            return _heap_min_risk(grid, source, target, stats)
+        case Engine.DIAL:
+            return _dial_min_risk(grid, source, target, stats)
+        case Engine.ASTAR:
+            return _astar_min_risk(grid, source, target, stats)
+        case Engine.BIDIRECTIONAL:
+            return _bidirectional_min_risk(grid, source, target, stats)
+        case _:
+            raise NotImplementedError
+
+
+def parse_point(s: Optional[str]) -> Optional[Point]:
+    if s is None:
+        return None
+    r, c = s.split(',')
+    return (int(r), int(c))
+
+
+def search_options(f: Callable) -> Callable:
+    for option in reversed([
+        click.option('--engine',
+                     type=click.Choice([engine.value for engine in Engine]),
+                     default=Engine.HEAP.value, show_default=True),
+        click.option('--source', default='0,0', show_default=True,
+                     metavar='R,C'),
+        click.option('--target', metavar='R,C',
+                     help='Defaults to the bottom right corner.'),
+        click.option('--stats', is_flag=True,
+                     help='Report the number of cells expanded on stderr.'),
+    ]):
+        f = option(f)
+    return f
+
+
+def search(
+    grid: Grid,
+    engine: str,
+    source: str,
+    target: Optional[str],
+    stats: bool
+) -> int:
+    search_stats = SearchStats()
+    res = get_min_risk(grid, Engine(engine), cast(Point, parse_point(source)),
+                       parse_point(target), search_stats)
+    if stats:
+        print(f'expanded {search_stats.expanded}', file=sys.stderr)
+    return res
+
+
+@ main.command()
+@search_options
+def part1(engine: str, source: str, target: Optional[str], stats: bool):
+    with phase('parse'):
+        grid = get_grid(sys.stdin)
+    with phase('solve'):
+        res = search(grid, engine, source, target, stats)
+    print(res)
 
 
 def incr_wrap_1_idx(v: int) -> int:
@@ -75,25 +423,170 @@ def incr_wrap_1_idx(v: int) -> int:
     return res if res < 10 else res - 9
 
 
-def get_extended_grid(inp: TextIO) -> Grid:
+def get_extended_grid(inp: TextIO, tiles: int = 5) -> DigitGrid:
     grid = get_grid(inp)
-    orig_width = len(grid[0])
 
-    for row in grid:
-        for c in range(orig_width, 5*orig_width):
-            row.append(incr_wrap_1_idx(row[c-orig_width]))
+    # incr_tables[k] maps each risk to its value k (mod 9) tiles away
+    incr_tables = [bytes(range(256))]
+    for _ in range(MAX_RISK - 1):
+        prev = incr_tables[-1]
+        incr_tables.append(
+            bytes(incr_wrap_1_idx(v) for v in prev[:10]) + prev[10:])
+
+    cells = bytearray()
+    for tile_r in range(tiles):
+        for r in range(grid.height):
+            row = bytes(grid.row(r))
+            for tile_c in range(tiles):
+                cells += row.translate(
+                    incr_tables[(tile_r + tile_c) % MAX_RISK])
 
-    orig_height = len(grid)
-    for r in range(orig_height, 5*orig_height):
-        grid.append([incr_wrap_1_idx(v) for v in grid[r-orig_height]])
+    return DigitGrid(cells, tiles * grid.height, tiles * grid.width)
 
-    return grid
+
+def get_tiled_grid(inp: TextIO, tiles: int = 5) -> TiledGrid:
+    return TiledGrid(get_grid(inp), tiles)
 
 
 @ main.command()
-def part2():
-    grid = get_extended_grid(sys.stdin)
-    print(get_min_risk(grid))
+@search_options
+@click.option('--tiles', type=int, default=5, show_default=True)
+@click.option('--virtual', is_flag=True,
+              help='Compute tiled risks on access instead of building the '
+              'extended grid.')
+def part2(engine: str, source: str, target: Optional[str], stats: bool,
+          tiles: int, virtual: bool):
+    with phase('parse'):
+        grid = (get_tiled_grid(sys.stdin, tiles) if virtual
+                else get_extended_grid(sys.stdin, tiles))
+    with phase('solve'):
+        res = search(grid, engine, source, target, stats)
+    print(res)
+
+
+Query: TypeAlias = tuple[Point, Point]
+
+
+def _answer_from_source(
+    grid: Grid,
+    source: Point,
+    targets: Sequence[Point]
+) -> list[int]:
+    target_idxs = [r * grid.stride + c for r, c in targets]
+    costs = _dial_costs(grid, source[0] * grid.stride + source[1],
+                        set(target_idxs), SearchStats())
+    return [costs[idx] for idx in target_idxs]
+
+
+_shared_mem: Optional[SharedMemory] = None
+_shared_grid: Optional[Grid] = None
+
+
+def _attach_shared_grid(
+    name: str,
+    height: int,
+    width: int,
+    tiles: Optional[int]
+):
+    global _shared_mem, _shared_grid
+    _shared_mem = SharedMemory(name=name)
+    # A memoryview supports all the cell indexing the engines do
+    cells = cast(bytearray, _shared_mem.buf[:height * width])
+    base = DigitGrid(cells, height, width)
+    _shared_grid = base if tiles is None else TiledGrid(base, tiles)
+
+
+def _answer_from_shared_source(
+    source: Point,
+    targets: Sequence[Point]
+) -> list[int]:
+    assert _shared_grid is not None
+    return _answer_from_source(_shared_grid, source, targets)
+
+
+def _answer_in_pool(
+    grid: Grid,
+    targets_by_source: dict[Point, list[Point]],
+    workers: int
+) -> list[list[int]]:
+    if isinstance(grid, TiledGrid):
+        base, tiles = grid.base, grid.tiles
+    else:
+        base, tiles = grid, None
+
+    shm = SharedMemory(create=True, size=len(base.cells))
+    try:
+        shm.buf[:len(base.cells)] = base.cells
+        with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_attach_shared_grid,
+                initargs=(shm.name, base.height, base.width, tiles)
+        ) as executor:
+            return list(executor.map(_answer_from_shared_source,
+                                     targets_by_source.keys(),
+                                     targets_by_source.values()))
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def answer_queries(
+    grid: Grid,
+    queries: Sequence[Query],
+    workers: int = 1
+) -> list[int]:
+    """
+    Returns the lowest total risk for each (source, target) query.
+
+    Queries sharing a source are answered from a single search, which runs
+    until all of that source's targets are settled. With more than one
+    worker, distinct sources are searched in separate processes which read
+    the grid from shared memory.
+    """
+    targets_by_source: dict[Point, list[Point]] = defaultdict(list)
+    for source, target in queries:
+        for r, c in (source, target):
+            if not (0 <= r < grid.height and 0 <= c < grid.width):
+                raise ValueError(f'{(r, c)} is outside the grid')
+        targets_by_source[source].append(target)
+
+    if workers > 1 and len(targets_by_source) > 1:
+        results = _answer_in_pool(grid, targets_by_source, workers)
+    else:
+        results = [_answer_from_source(grid, source, targets)
+                   for source, targets in targets_by_source.items()]
+
+    answers: dict[Query, int] = {}
+    for (source, targets), costs in zip(targets_by_source.items(), results):
+        for target, cost in zip(targets, costs):
+            answers[(source, target)] = cost
+
+    return [answers[query] for query in queries]
+
+
+def parse_query(s: str) -> Query:
+    source, target = s.split()
+    return (cast(Point, parse_point(source)), cast(Point, parse_point(target)))
+
+
+@main.command()
+@click.option('-q', '--queries', 'queries_file', type=click.File(),
+              required=True, help='File of "R,C R,C" source/target pairs, '
+              'one per line.')
+@click.option('--tiles', type=int, default=1, show_default=True)
+@click.option('-j', '--workers', type=int, default=1, show_default=True)
+def query(queries_file: TextIO, tiles: int, workers: int):
+    with phase('parse'):
+        grid: Grid = get_grid(sys.stdin)
+        if tiles > 1:
+            grid = TiledGrid(grid, tiles)
+        queries = [parse_query(line) for line in queries_file if line.strip()]
+
+    with phase('solve'):
+        answers = answer_queries(grid, queries, workers)
+
+    for answer in answers:
+        print(answer)
 
 
 if __name__ == '__main__':
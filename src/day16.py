@@ -1,11 +1,122 @@
-from typing import TextIO, cast
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import (Callable, Generator, Iterable, Iterator, Sequence, TextIO,
+                    TypeAlias, cast)
 from enum import Enum
-from bitstring import BitStream
 from dataclasses import dataclass
 from math import prod
 import click
 import sys
 
+from profiling import phase, profile_option
+
+HEX_CHUNK_SIZE = 1 << 16
+
+
+class BitReader:
+    """
+    Reads big-endian unsigned bit fields from a byte string.
+    """
+    _data: bytes
+    pos: int
+
+    def __init__(self, data: bytes, pos: int = 0) -> None:
+        self._data = data
+        self.pos = pos
+
+    @staticmethod
+    def from_hex(s: str) -> "BitReader":
+        s = s.strip()
+        return BitReader(bytes.fromhex(s if len(s) % 2 == 0 else s + '0'))
+
+    def read(self, n: int) -> int:
+        start = self.pos >> 3
+        self.pos += n
+        end = (self.pos + 7) >> 3
+        if end > len(self._data):
+            raise EOFError(f'read past the end of {len(self._data)} bytes')
+
+        chunk = int.from_bytes(self._data[start:end], 'big')
+        return (chunk >> ((end << 3) - self.pos)) & ((1 << n) - 1)
+
+
+class HexStreamReader:
+    """
+    Reads big-endian unsigned bit fields from one line of hex digits, which
+    is read from a text stream a chunk at a time as the fields are needed.
+
+    Only the bytes from the current position onwards are kept, so memory
+    does not grow with the length of the line.
+    """
+    pos: int
+    _inp: TextIO
+    _chunk_size: int
+    _data: bytes
+    # The bit position of the start of _data
+    _base: int
+    line_done: bool
+    eof: bool
+
+    def __init__(
+        self,
+        inp: TextIO,
+        chunk_size: int = HEX_CHUNK_SIZE
+    ) -> None:
+        self.pos = 0
+        self._inp = inp
+        self._chunk_size = chunk_size - chunk_size % 2
+        self._data = b''
+        self._base = 0
+        self.line_done = False
+        self.eof = False
+
+    def _read_chunk(self) -> str:
+        chunk = self._inp.readline(self._chunk_size)
+        if not chunk:
+            self.eof = True
+        if not chunk or chunk.endswith('\n'):
+            self.line_done = True
+        return chunk.strip()
+
+    def fill(self, end_pos: int) -> bool:
+        """
+        Reads from the stream until the bits before end_pos are buffered.
+
+        Returns False if the line ends first.
+        """
+        while self._base + (len(self._data) << 3) < end_pos:
+            if self.line_done:
+                return False
+
+            chunk = self._read_chunk()
+            if len(chunk) % 2 != 0:
+                chunk += '0'
+            keep_from = (self.pos - self._base) >> 3
+            self._data = self._data[keep_from:] + bytes.fromhex(chunk)
+            self._base += keep_from << 3
+
+        return True
+
+    def finish_line(self):
+        while not self.line_done:
+            self._read_chunk()
+
+    def read(self, n: int) -> int:
+        if not self.fill(self.pos + n):
+            raise EOFError('read past the end of the line')
+
+        start = (self.pos - self._base) >> 3
+        self.pos += n
+        end_pos = self.pos - self._base
+        end = (end_pos + 7) >> 3
+
+        chunk = int.from_bytes(self._data[start:end], 'big')
+        return (chunk >> ((end << 3) - end_pos)) & ((1 << n) - 1)
+
+
+Bits: TypeAlias = BitReader | HexStreamReader
+
 
 class PacketType(Enum):
     Op_Sum = 0
@@ -23,77 +134,124 @@ class Literal:
     value: int
 
     @staticmethod
-    def parse(bits: BitStream) -> "Literal":
-        int_bits = BitStream()
+    def parse(bits: Bits) -> "Literal":
+        value = 0
         keep_reading = True
         while keep_reading:
-            keep_reading = cast('bool', bits.read('bool'))
-            int_bits.append(bits.read(4))
-        return Literal(value=int_bits.uint)
+            group = bits.read(5)
+            keep_reading = bool(group & 0b10000)
+            value = (value << 4) | (group & 0b1111)
+        return Literal(value=value)
 
     def eval(self) -> int: return self.value
 
 
+OPERATORS: dict[PacketType, Callable[[Sequence[int]], int]] = {
+    PacketType.Op_Sum: sum,
+    PacketType.Op_Product: prod,
+    PacketType.Op_Min: min,
+    PacketType.Op_Max: max,
+    PacketType.Op_Gt: lambda values: int(values[0] > values[1]),
+    PacketType.Op_Lt: lambda values: int(values[0] < values[1]),
+    PacketType.Op_Eq: lambda values: int(values[0] == values[1]),
+}
+
+
 @dataclass
 class OperatorData:
     op: PacketType
     subpackets: list["BITSPacket"]
 
-    @staticmethod
-    def parse_subp_by_length(bits: BitStream, length: int) -> list["BITSPacket"]:
-        total_read = 0
-        res: list["BITSPacket"] = []
-        while total_read < length:
-            next_subp = BITSPacket.parse(bits)
-            res.append(next_subp)
-            total_read += next_subp.length
+    def apply(self, values: Sequence[int]) -> int:
+        """
+        Combines the already evaluated values of the subpackets.
+        """
+        if (operator := OPERATORS.get(self.op)) is None:
+            raise NotImplementedError
+        return operator(values)
 
-        return res
 
-    @staticmethod
-    def parse_n_subp(bits: BitStream, n: int) -> list["BITSPacket"]:
-        res: list["BITSPacket"] = []
-        for _ in range(n):
-            res.append(BITSPacket.parse(bits))
+# A packet as (length, version, type, literal value or subpacket count)
+PostfixNode: TypeAlias = tuple[int, int, PacketType, int]
 
-        return res
+
+@dataclass
+class _OpenOperator:
+    """
+    An operator packet whose header has been read but whose subpackets have
+    not all been parsed yet.
+    """
+    start_pos: int
+    version: int
+    op: PacketType
+    by_length: bool
+    # The bit position the subpackets end at if by_length, else their count
+    limit: int
+    num_subpackets: int = 0
 
     @staticmethod
-    def parse(op_type: PacketType, bits: BitStream) -> "OperatorData":
-        length_type_id = cast('int', bits.read('uint:1'))
+    def parse_header(
+        start_pos: int,
+        version: int,
+        op: PacketType,
+        bits: Bits
+    ) -> "_OpenOperator":
+        length_type_id = bits.read(1)
         match length_type_id:
             case 0:
-                length = cast('int', bits.read('uint:15'))
-                subpackets = OperatorData.parse_subp_by_length(bits, length)
+                length = bits.read(15)
+                return _OpenOperator(start_pos, version, op, True,
+                                     bits.pos + length)
             case 1:
-                n = cast('int', bits.read('uint:11'))
-                subpackets = OperatorData.parse_n_subp(bits, n)
+                n = bits.read(11)
+                return _OpenOperator(start_pos, version, op, False, n)
             case _:
                 raise ValueError
 
-        return OperatorData(op_type, subpackets)
+    def is_complete(self, pos: int) -> bool:
+        if self.by_length:
+            return pos >= self.limit
+        return self.num_subpackets == self.limit
 
-    def eval(self) -> int:
-        match self.op:
-            case PacketType.Op_Sum:
-                return sum(subp.eval() for subp in self.subpackets)
-            case PacketType.Op_Product:
-                return prod(subp.eval() for subp in self.subpackets)
-            case PacketType.Op_Min:
-                return min(subp.eval() for subp in self.subpackets)
-            case PacketType.Op_Max:
-                return max(subp.eval() for subp in self.subpackets)
-            case PacketType.Op_Gt:
-                return int(self.subpackets[0].eval() >
-                           self.subpackets[1].eval())
-            case PacketType.Op_Lt:
-                return int(self.subpackets[0].eval() <
-                           self.subpackets[1].eval())
-            case PacketType.Op_Eq:
-                return int(self.subpackets[0].eval() ==
-                           self.subpackets[1].eval())
-            case _:
-                raise NotImplementedError
+    def close(self, pos: int) -> PostfixNode:
+        return (pos - self.start_pos, self.version, self.op,
+                self.num_subpackets)
+
+
+def iter_postfix(bits: Bits) -> Generator[PostfixNode, None, None]:
+    """
+    Parses one packet, yielding it and all of its subpackets in postfix
+    order, i.e. every packet after its subpackets.
+
+    Operators still being parsed are kept on an explicit stack rather than
+    recursing, so nesting depth is only limited by memory.
+    """
+    open_ops: list[_OpenOperator] = []
+    while True:
+        initial_pos = bits.pos
+        version = bits.read(3)
+        type_id = PacketType(bits.read(3))
+        match type_id:
+            case PacketType.Literal:
+                value = Literal.parse(bits).value
+                yield (bits.pos - initial_pos, version, type_id, value)
+            case op:
+                open_op = _OpenOperator.parse_header(
+                    initial_pos, version, op, bits)
+                if not open_op.is_complete(bits.pos):
+                    open_ops.append(open_op)
+                    continue
+                yield open_op.close(bits.pos)
+
+        while open_ops:
+            parent = open_ops[-1]
+            parent.num_subpackets += 1
+            if not parent.is_complete(bits.pos):
+                break
+            open_ops.pop()
+            yield parent.close(bits.pos)
+        else:
+            return
 
 
 @dataclass
@@ -103,49 +261,244 @@ class BITSPacket:
     data: Literal | OperatorData
 
     @staticmethod
-    def parse(bits: BitStream) -> "BITSPacket":
-        initial_pos = bits.pos
-        version = cast('int', bits.read('uint:3'))
-        type_id = PacketType(cast('int', bits.read('uint:3')))
-        match type_id:
-            case PacketType.Literal:
-                data = Literal.parse(bits)
-            case op:
-                data = OperatorData.parse(op, bits)
+    def parse(bits: Bits) -> "BITSPacket":
+        packets: list[BITSPacket] = []
+        for length, version, type_id, arg in iter_postfix(bits):
+            if type_id == PacketType.Literal:
+                packets.append(BITSPacket(length, version, Literal(arg)))
+                continue
+
+            split = len(packets) - arg
+            data = OperatorData(type_id, packets[split:])
+            del packets[split:]
+            packets.append(BITSPacket(length, version, data))
+
+        packet, = packets
+        return packet
+
+    def eval(self) -> int:
+        # Each frame is an operator, its remaining subpackets and the values
+        # of the subpackets evaluated so far
+        frames: list[tuple[OperatorData, Iterator[BITSPacket], list[int]]] = []
+        packet = self
+        while True:
+            if isinstance(packet.data, Literal):
+                value = packet.data.eval()
+            else:
+                frames.append((packet.data, iter(packet.data.subpackets), []))
+                value = None
+
+            while frames:
+                op_data, remaining, values = frames[-1]
+                if value is not None:
+                    values.append(value)
+                if (next_packet := next(remaining, None)) is not None:
+                    packet = next_packet
+                    break
+                frames.pop()
+                value = op_data.apply(values)
+            else:
+                return cast(int, value)
+
+
+@dataclass
+class Program:
+    """
+    A packet and its subpackets flattened into postfix order as parallel
+    arrays: each packet's type id, version, number of subpackets (0 for
+    literals) and literal value (0 for operators).
+
+    Literal values are kept in an unsigned 64-bit array unless one is too
+    large for it.
+    """
+    opcodes: array
+    versions: array
+    arities: array
+    values: Sequence[int]
+
+    @staticmethod
+    def from_postfix(nodes: Iterable[PostfixNode]) -> "Program":
+        opcodes = array('B')
+        versions = array('B')
+        arities = array('H')
+        values: array | list[int] = array('Q')
+        for _, version, type_id, arg in nodes:
+            opcodes.append(type_id.value)
+            versions.append(version)
+            if type_id != PacketType.Literal:
+                arities.append(arg)
+                values.append(0)
+                continue
+
+            arities.append(0)
+            try:
+                values.append(arg)
+            except OverflowError:
+                values = list(values)
+                values.append(arg)
+
+        return Program(opcodes, versions, arities, values)
 
-        length = bits.pos - initial_pos
-        return BITSPacket(length, version, data)
+    @staticmethod
+    def parse(bits: Bits) -> "Program":
+        return Program.from_postfix(iter_postfix(bits))
+
+    @staticmethod
+    def compile(packet: BITSPacket) -> "Program":
+        def postfix() -> Generator[PostfixNode, None, None]:
+            to_visit: list[tuple[BITSPacket, bool]] = [(packet, False)]
+            while to_visit:
+                packet_, expanded = to_visit.pop()
+                match packet_.data:
+                    case Literal(value):
+                        yield (packet_.length, packet_.version,
+                               PacketType.Literal, value)
+                    case OperatorData(op, subpackets) if expanded:
+                        yield (packet_.length, packet_.version, op,
+                               len(subpackets))
+                    case OperatorData(_, subpackets):
+                        to_visit.append((packet_, True))
+                        to_visit.extend((subp, False)
+                                        for subp in reversed(subpackets))
+
+        return Program.from_postfix(postfix())
+
+    def version_sum(self) -> int:
+        return sum(self.versions)
 
     def eval(self) -> int:
-        return self.data.eval()
+        literal = PacketType.Literal.value
+        operators = [OPERATORS.get(PacketType(opcode))
+                     for opcode in range(len(PacketType))]
+
+        stack: list[int] = []
+        for opcode, arity, value in zip(self.opcodes, self.arities,
+                                        self.values):
+            if opcode == literal:
+                stack.append(value)
+                continue
+
+            split = len(stack) - arity
+            res = operators[opcode](stack[split:])  # type: ignore
+            del stack[split:]
+            stack.append(res)
+
+        res, = stack
+        return res
 
 
 @click.group()
+@profile_option
 def main(): pass
 
 
 def version_sum(packet: BITSPacket) -> int:
-    total = packet.version
-    if isinstance(packet.data, OperatorData):
-        total += sum(version_sum(subp) for subp in packet.data.subpackets)
+    total = 0
+    to_visit = [packet]
+    while to_visit:
+        packet = to_visit.pop()
+        total += packet.version
+        if isinstance(packet.data, OperatorData):
+            to_visit.extend(packet.data.subpackets)
 
     return total
 
 
 def get_packet(inp: TextIO) -> BITSPacket:
-    return BITSPacket.parse(BitStream('0x' + inp.readline()))
+    return BITSPacket.parse(BitReader.from_hex(inp.readline()))
+
+
+def get_program(inp: TextIO) -> Program:
+    return Program.parse(BitReader.from_hex(inp.readline()))
 
 
 @main.command()
 def part1():
-    packet = get_packet(sys.stdin)
-    print(version_sum(packet))
+    with phase('parse'):
+        program = get_program(sys.stdin)
+    with phase('solve'):
+        res = program.version_sum()
+    print(res)
 
 
 @main.command()
 def part2():
-    packet = get_packet(sys.stdin)
-    print(packet.eval())
+    with phase('parse'):
+        program = get_program(sys.stdin)
+    with phase('solve'):
+        res = program.eval()
+    print(res)
+
+
+def evaluate(bits: Bits) -> tuple[int, int]:
+    """
+    Returns the version sum and value of one transmission, evaluating its
+    packets as they are parsed rather than keeping them.
+
+    Only the values of the subpackets of operators still being parsed are
+    held, so memory is bounded by the nesting depth times the largest
+    number of subpackets in one operator.
+    """
+    total_version = 0
+    values: list[int] = []
+    for _, version, type_id, arg in iter_postfix(bits):
+        total_version += version
+        if type_id == PacketType.Literal:
+            values.append(arg)
+            continue
+
+        split = len(values) - arg
+        res = OPERATORS[type_id](values[split:])
+        del values[split:]
+        values.append(res)
+
+    value, = values
+    return (total_version, value)
+
+
+def _evaluate_hex(line: str) -> tuple[int, int]:
+    return evaluate(BitReader.from_hex(line))
+
+
+def iter_transmissions(
+    inp: TextIO,
+    workers: int = 1,
+    batch_size: int = 1024
+) -> Generator[tuple[int, int], None, None]:
+    """
+    Yields the version sum and value of each transmission in inp, one per
+    line, skipping blank lines.
+
+    With one worker, each line is decoded as it is read, a chunk of hex at a
+    time. Otherwise, lines are read in batches and fanned out across a
+    process pool, so each line is held in memory whole.
+    """
+    if workers <= 1:
+        while True:
+            bits = HexStreamReader(inp)
+            if bits.fill(1):
+                yield evaluate(bits)
+            bits.finish_line()
+            if bits.eof:
+                return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        lines = (line for line in inp if line.strip())
+        while batch := list(islice(lines, batch_size)):
+            yield from executor.map(_evaluate_hex, batch,
+                                    chunksize=max(1, len(batch) // workers))
+
+
+@main.command()
+@click.option('-j', '--workers', type=int, default=1, show_default=True)
+def stream(workers: int):
+    """
+    Prints the version sum and value of every transmission on stdin, one
+    per line.
+    """
+    with phase('solve'):
+        for total_version, value in iter_transmissions(sys.stdin, workers):
+            print(total_version, value)
 
 
 if __name__ == '__main__':
@@ -4,8 +4,11 @@ from dataclasses import dataclass, replace
 from typing import Callable, Generator, Iterable, TypeVar
 import click
 
+from profiling import phase, profile_option
+
 
 @click.group()
+@profile_option
 def main():
     pass
 
@@ -68,7 +71,10 @@ def do_command_sequence(
 
 @main.command()
 def part1():
-    pos = do_command_sequence(get_input(), Position(), update_position)
+    with phase('parse'):
+        commands = list(get_input())
+    with phase('solve'):
+        pos = do_command_sequence(commands, Position(), update_position)
     print(pos.depth * pos.horizontal_pos)
 
 
@@ -94,8 +100,11 @@ def update_position_and_aim(
 
 @main.command()
 def part2():
-    pos = do_command_sequence(
-        get_input(), PositionAndAim(), update_position_and_aim).position
+    with phase('parse'):
+        commands = list(get_input())
+    with phase('solve'):
+        pos = do_command_sequence(
+            commands, PositionAndAim(), update_position_and_aim).position
     print(pos.depth * pos.horizontal_pos)
 
 
@@ -3,8 +3,11 @@ from typing import (Collection, Generator, Iterable,
                     Optional, Sequence, cast)
 import click
 
+from profiling import phase, profile_option
+
 
 @click.group()
+@profile_option
 def main():
     pass
 
@@ -48,11 +51,15 @@ def bit_seq_to_int(bit_seq: BitSequence) -> int:
 
 @main.command()
 def part1():
-    most_common_bits = get_most_common_bits_by_place(get_bit_sequences())
+    with phase('parse'):
+        all_bit_seqs = list(get_bit_sequences())
+
+    with phase('solve'):
+        most_common_bits = get_most_common_bits_by_place(all_bit_seqs)
 
-    gamma_rate = bit_seq_to_int(most_common_bits)
-    bit_mask = 2 ** len(most_common_bits) - 1
-    epsilon_rate = gamma_rate ^ bit_mask
+        gamma_rate = bit_seq_to_int(most_common_bits)
+        bit_mask = 2 ** len(most_common_bits) - 1
+        epsilon_rate = gamma_rate ^ bit_mask
 
     print(gamma_rate * epsilon_rate)
 
@@ -82,11 +89,14 @@ def do_filter_by_bit(
 
 @main.command()
 def part2():
-    all_bit_seqs = list(get_bit_sequences())
-    oxygen_generator_rating = bit_seq_to_int(do_filter_by_bit(
-        all_bit_seqs, keep_most_common=True))
-    co2_scrubber_rating = bit_seq_to_int(do_filter_by_bit(
-        all_bit_seqs, keep_most_common=False))
+    with phase('parse'):
+        all_bit_seqs = list(get_bit_sequences())
+
+    with phase('solve'):
+        oxygen_generator_rating = bit_seq_to_int(do_filter_by_bit(
+            all_bit_seqs, keep_most_common=True))
+        co2_scrubber_rating = bit_seq_to_int(do_filter_by_bit(
+            all_bit_seqs, keep_most_common=False))
 
     print(oxygen_generator_rating * co2_scrubber_rating)
 
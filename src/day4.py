@@ -4,10 +4,13 @@ from collections import defaultdict
 from typing import Generator, Iterable, Optional, Sequence
 import click
 
+from profiling import phase, profile_option
+
 NUM_ROWS: int = 5
 
 
 @click.group()
+@profile_option
 def main(): pass
 
 
@@ -104,19 +107,23 @@ def get_results(
 
 @main.command()
 def part1():
-    number_order, boards = get_input()
+    with phase('parse'):
+        number_order, boards = get_input()
 
-    res = next(get_results(number_order, boards))
+    with phase('solve'):
+        res = next(get_results(number_order, boards))
     print(res)
 
 
 @ main.command()
 def part2():
-    number_order, boards = get_input()
+    with phase('parse'):
+        number_order, boards = get_input()
 
     res: Optional[int] = None
-    for res in get_results(number_order, boards):
-        pass
+    with phase('solve'):
+        for res in get_results(number_order, boards):
+            pass
 
     print(res)
 
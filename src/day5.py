@@ -1,29 +1,35 @@
-from typing import Generator, Iterable, TextIO
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from typing import (Callable, Generator, Iterable, NamedTuple, TextIO,
+                    TypeAlias)
 import click
 import sys
-from collections import defaultdict
+from collections import Counter, defaultdict
 from dataclasses import dataclass
+from enum import Enum
+import numpy as np
+
+from profiling import phase, profile_option
 
 
 @click.group()
+@profile_option
 def main(): pass
 
 
-@dataclass(eq=True, frozen=True)
+# Cells are packed into ints as y * CELL_KEY_STRIDE + x, which is unique for
+# coordinates in [-MAX_COORD, MAX_COORD)
+CELL_KEY_STRIDE = 1 << 32
+MAX_COORD = CELL_KEY_STRIDE // 2
+
+
+@dataclass(eq=True, frozen=True, slots=True)
 class Point:
     x: int
     y: int
 
 
-def bidirectional_range_inclusive(
-    start: int, end: int
-) -> Generator[int, None, None]:
-    step = 1 if end > start else -1
-    for i in range(start, end+step, step):
-        yield i
-
-
-@dataclass
+@dataclass(slots=True)
 class Line:
     start: Point
     end: Point
@@ -34,18 +40,31 @@ class Line:
     def is_vertical(self) -> bool:
         return self.start.x == self.end.x
 
+    def cell_keys(self) -> range:
+        """
+        Returns the covered cells packed as y * CELL_KEY_STRIDE + x, which are
+        cheaper to build and hash than Points. Each line is then a range of
+        keys: step 1 if horizontal, CELL_KEY_STRIDE if vertical and
+        CELL_KEY_STRIDE +/- 1 if diagonal.
+        """
+        if not all(-MAX_COORD <= v < MAX_COORD
+                   for v in (self.start.x, self.start.y,
+                             self.end.x, self.end.y)):
+            raise ValueError(f'{self} has coordinates too large to pack')
+
+        step_x = (self.end.x > self.start.x) - (self.end.x < self.start.x)
+        step_y = (self.end.y > self.start.y) - (self.end.y < self.start.y)
+        step = step_y * CELL_KEY_STRIDE + step_x
+        start = self.start.y * CELL_KEY_STRIDE + self.start.x
+        end = self.end.y * CELL_KEY_STRIDE + self.end.x
+        if not step:
+            return range(start, start + 1)
+        return range(start, end + step, step)
+
     def points(self) -> Generator[Point, None, None]:
-        if self.is_horizontal():
-            for x in bidirectional_range_inclusive(self.start.x, self.end.x):
-                yield Point(x, self.start.y)
-        elif self.is_vertical():
-            for y in bidirectional_range_inclusive(self.start.y, self.end.y):
-                yield Point(self.start.x, y)
-        else:
-            for x, y in zip(
-                    bidirectional_range_inclusive(self.start.x, self.end.x),
-                    bidirectional_range_inclusive(self.start.y, self.end.y)):
-                yield Point(x, y)
+        for key in self.cell_keys():
+            y, x = divmod(key + MAX_COORD, CELL_KEY_STRIDE)
+            yield Point(x - MAX_COORD, y)
 
 
 def parse_point(s: str) -> Point:
@@ -66,25 +85,274 @@ def is_horizontal_or_vertical(line: Line):
 def count_overlap_points(
     lines: Iterable[Line], *, exclude_diagonal: bool
 ) -> int:
-    number_of_lines: dict[Point, int] = defaultdict(int)
+    number_of_lines = Counter(chain.from_iterable(
+        line.cell_keys() for line in lines
+        if not exclude_diagonal or is_horizontal_or_vertical(line)))
+
+    return sum(1 for n in number_of_lines.values() if n > 1)
+
+
+# Largest grid rasterized densely by the numpy engine; beyond this covered
+# cells are counted by sorting their indices instead
+MAX_DENSE_CELLS = 1 << 26
+
+
+def get_line_array(input: TextIO) -> np.ndarray:
+    """
+    Parses every line at once into an (n, 4) array of x1, y1, x2, y2.
+    """
+    text = input.read().replace('->', ' ').replace(',', ' ')
+    return np.array(text.split(), dtype=np.int64).reshape(-1, 4)
+
+
+def count_overlap_points_numpy(
+    lines: np.ndarray, *, exclude_diagonal: bool
+) -> int:
+    """
+    Counts the cells covered by at least two lines, given as an array from
+    get_line_array.
+
+    On a grid flattened row-major with width w, every line is a strided
+    range of cells: step 1 if horizontal, w if vertical and w +/- 1 if
+    diagonal. Each line is then one slice increment of a dense grid.
+    """
+    x1, y1, x2, y2 = lines.T
+    if exclude_diagonal:
+        keep = (x1 == x2) | (y1 == y2)
+        x1, y1, x2, y2 = x1[keep], y1[keep], x2[keep], y2[keep]
+    if len(x1) == 0:
+        return 0
+
+    min_x = min(x1.min(), x2.min())
+    min_y = min(y1.min(), y2.min())
+    width = int(max(x1.max(), x2.max()) - min_x + 1)
+    height = int(max(y1.max(), y2.max()) - min_y + 1)
+
+    start = (y1 - min_y) * width + (x1 - min_x)
+    end = (y2 - min_y) * width + (x2 - min_x)
+    low = np.minimum(start, end)
+    stride = np.abs(np.sign(y2 - y1) * width + np.sign(x2 - x1))
+    stride[stride == 0] = 1
+    lengths = np.maximum(np.abs(x2 - x1), np.abs(y2 - y1)) + 1
+
+    if width * height <= MAX_DENSE_CELLS:
+        grid = np.zeros(width * height, dtype=np.int32)
+        for first, length, step in zip(low.tolist(), lengths.tolist(),
+                                       stride.tolist()):
+            grid[first:first + length * step:step] += 1
+        return int(np.count_nonzero(grid > 1))
+
+    # Sparse: list the index of every covered cell and count repeats
+    line_starts = np.cumsum(lengths) - lengths
+    offsets = np.arange(lengths.sum()) - np.repeat(line_starts, lengths)
+    cells = np.repeat(low, lengths) + offsets * np.repeat(stride, lengths)
+    _, counts = np.unique(cells, return_counts=True)
+    return int(np.count_nonzero(counts > 1))
+
+
+# Sorted, disjoint inclusive ranges (starts, ends) along one line
+Intervals: TypeAlias = tuple[list[int], list[int]]
+
+
+class LineFamily(NamedTuple):
+    """
+    Lines of one direction. Each is identified by a key that is constant
+    along it, and covers a range of a coordinate t that moves along it.
+    """
+    key: Callable[[int, int], int]
+    t: Callable[[int, int], int]
+    cell: Callable[[int, int], tuple[int, int]]
+
+
+HORIZONTAL = LineFamily(key=lambda x, y: y, t=lambda x, y: x,
+                        cell=lambda k, t: (t, k))
+VERTICAL = LineFamily(key=lambda x, y: x, t=lambda x, y: y,
+                      cell=lambda k, t: (k, t))
+DIAGONAL = LineFamily(key=lambda x, y: x - y, t=lambda x, y: x,
+                      cell=lambda k, t: (t, t - k))
+ANTIDIAGONAL = LineFamily(key=lambda x, y: x + y, t=lambda x, y: x,
+                          cell=lambda k, t: (t, k - t))
+
+
+def get_family(line: Line) -> LineFamily:
+    if line.is_horizontal():
+        return HORIZONTAL
+    elif line.is_vertical():
+        return VERTICAL
+    elif (line.end.x - line.start.x) == (line.end.y - line.start.y):
+        return DIAGONAL
+    return ANTIDIAGONAL
+
+
+def merge_intervals(
+    intervals: Iterable[tuple[int, int]]
+) -> tuple[Intervals, Intervals]:
+    """
+    Returns the ranges covered by at least one and at least two of the
+    inclusive intervals.
+    """
+    deltas: dict[int, int] = defaultdict(int)
+    for start, end in intervals:
+        deltas[start] += 1
+        deltas[end + 1] -= 1
+
+    once: Intervals = ([], [])
+    twice: Intervals = ([], [])
+    coverage = 0
+    for pos in sorted(deltas):
+        new_coverage = coverage + deltas[pos]
+        for res, threshold in ((once, 1), (twice, 2)):
+            if coverage < threshold <= new_coverage:
+                res[0].append(pos)
+            elif new_coverage < threshold <= coverage:
+                res[1].append(pos - 1)
+        coverage = new_coverage
+
+    return once, twice
+
+
+def intervals_contain(intervals: Intervals, t: int) -> bool:
+    starts, ends = intervals
+    idx = bisect_right(starts, t) - 1
+    return idx >= 0 and t <= ends[idx]
+
+
+class FamilyCoverage:
+    """
+    The cells covered by the lines of one family, merged per key.
+    """
+    family: LineFamily
+    keys: list[int]
+    once: dict[int, Intervals]
+    twice: dict[int, Intervals]
+
+    def __init__(self, family: LineFamily, lines: Iterable[Line]) -> None:
+        by_key: dict[int, list[tuple[int, int]]] = defaultdict(list)
+        for line in lines:
+            t_start = family.t(line.start.x, line.start.y)
+            t_end = family.t(line.end.x, line.end.y)
+            by_key[family.key(line.start.x, line.start.y)].append(
+                (min(t_start, t_end), max(t_start, t_end)))
+
+        self.family = family
+        self.keys = sorted(by_key)
+        self.once = {}
+        self.twice = {}
+        for key, intervals in by_key.items():
+            self.once[key], self.twice[key] = merge_intervals(intervals)
+
+    def count_twice(self) -> int:
+        return sum(end - start + 1
+                   for starts, ends in self.twice.values()
+                   for start, end in zip(starts, ends))
+
+    def covers(self, x: int, y: int, intervals: dict[int, Intervals]) -> bool:
+        key = self.family.key(x, y)
+        return key in intervals and intervals_contain(intervals[key],
+                                                      self.family.t(x, y))
+
+    def crossings(
+        self, other: "FamilyCoverage"
+    ) -> Generator[tuple[int, int], None, None]:
+        """
+        Yields the cells covered by both families, which are of different
+        directions, so any two of their lines share at most one cell.
+        """
+        f = self.family
+        g = other.family
+        for key in self.keys:
+            for start, end in zip(*self.once[key]):
+                # The other family's key changes linearly along this line
+                other_key_start = g.key(*f.cell(key, start))
+                step = g.key(*f.cell(key, start + 1)) - other_key_start
+                other_key_end = other_key_start + step * (end - start)
+
+                lo = bisect_left(other.keys,
+                                 min(other_key_start, other_key_end))
+                hi = bisect_right(other.keys,
+                                  max(other_key_start, other_key_end))
+                for other_key in other.keys[lo:hi]:
+                    offset, rem = divmod(other_key - other_key_start, step)
+                    if rem:
+                        continue
+                    x, y = f.cell(key, start + offset)
+                    if intervals_contain(other.once[other_key], g.t(x, y)):
+                        yield (x, y)
+
+
+def count_overlap_points_sweep(
+    lines: Iterable[Line], *, exclude_diagonal: bool
+) -> int:
+    """
+    Counts the cells covered by at least two lines without visiting the
+    cells of each line, in time depending on the number of lines and of
+    crossings between directions rather than on their lengths.
+
+    Lines are merged per row, column or diagonal into the ranges covered at
+    least once and at least twice by one family. Every other cell covered
+    twice is a crossing between two families.
+    """
+    by_family: dict[LineFamily, list[Line]] = defaultdict(list)
     for line in lines:
         if exclude_diagonal and not is_horizontal_or_vertical(line):
             continue
+        by_family[get_family(line)].append(line)
+    coverages = [FamilyCoverage(family, family_lines)
+                 for family, family_lines in by_family.items()]
+
+    crossings = {cell
+                 for i, coverage in enumerate(coverages)
+                 for other in coverages[i+1:]
+                 for cell in coverage.crossings(other)}
+
+    # Cells covered twice within a family are only counted more than once
+    # where they are also crossings
+    res = sum(coverage.count_twice() for coverage in coverages)
+    for x, y in crossings:
+        num_twice = sum(1 for coverage in coverages
+                        if coverage.covers(x, y, coverage.twice))
+        res += 1 if num_twice == 0 else 1 - num_twice
+    return res
+
+
+class Engine(Enum):
+    POINTS = 'points'
+    NUMPY = 'numpy'
+    SWEEP = 'sweep'
+
+
+def solve(engine: str, exclude_diagonal: bool) -> int:
+    if Engine(engine) == Engine.NUMPY:
+        with phase('parse'):
+            line_array = get_line_array(sys.stdin)
+        with phase('solve'):
+            return count_overlap_points_numpy(
+                line_array, exclude_diagonal=exclude_diagonal)
+
+    with phase('parse'):
+        lines = list(get_lines(sys.stdin))
+    with phase('solve'):
+        if Engine(engine) == Engine.SWEEP:
+            return count_overlap_points_sweep(
+                lines, exclude_diagonal=exclude_diagonal)
+        return count_overlap_points(lines, exclude_diagonal=exclude_diagonal)
 
-        for point in line.points():
-            number_of_lines[point] += 1
 
-    return sum(1 for _, n in number_of_lines.items() if n > 1)
+engine_option = click.option(
+    '--engine', type=click.Choice([engine.value for engine in Engine]),
+    default=Engine.POINTS.value, show_default=True)
 
 
 @main.command()
-def part1():
-    print(count_overlap_points(get_lines(sys.stdin), exclude_diagonal=True))
+@engine_option
+def part1(engine: str):
+    print(solve(engine, exclude_diagonal=True))
 
 
 @main.command()
-def part2():
-    print(count_overlap_points(get_lines(sys.stdin), exclude_diagonal=False))
+@engine_option
+def part2(engine: str):
+    print(solve(engine, exclude_diagonal=False))
 
 
 if __name__ == '__main__':
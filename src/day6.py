@@ -1,45 +1,203 @@
 from collections import deque
-from typing import Deque, Generator, Iterable, TextIO
+from typing import Callable, Deque, Generator, Iterable, TextIO, TypeAlias
 import click
 import sys
 
+from profiling import phase, profile_option
+
 
 @click.group()
+@profile_option
 def main(): pass
 
 
 TIMER_VAL_NEW = 8
 TIMER_VAL_RESET = 6
 
+# Largest offset of a horizon from the anchor of get_counts_at, which keeps
+# the coefficients combining the anchor's counts to a few machine words
+MAX_ANCHOR_OFFSET = 512
+
+# A polynomial in the step's transition matrix T, lowest power first
+Polynomial: TypeAlias = list[int]
+
 
 class LanternfishSimulation:
     lanternfish_counts: Deque[int]
+    timer_val_new: int
+    timer_val_reset: int
+    # T^n as a polynomial in T, for each n jumped by so far
+    _powers: dict[int, Polynomial]
 
-    def __init__(self, initial_timers: Iterable[int]) -> None:
-        self.lanternfish_counts = deque([0] * (TIMER_VAL_NEW + 1))
+    def __init__(
+        self,
+        initial_timers: Iterable[int],
+        timer_val_new: int = TIMER_VAL_NEW,
+        timer_val_reset: int = TIMER_VAL_RESET
+    ) -> None:
+        if not 0 <= timer_val_reset <= timer_val_new:
+            raise ValueError('timers must satisfy 0 <= reset <= new')
+        self.timer_val_new = timer_val_new
+        self.timer_val_reset = timer_val_reset
+        self._powers = {}
+        self.lanternfish_counts = deque([0] * (timer_val_new + 1))
 
         for timer in initial_timers:
+            if not 0 <= timer <= timer_val_new:
+                raise ValueError(f'timer {timer} is out of range')
             self.lanternfish_counts[timer] += 1
 
     def step(self) -> None:
         num_expiring_timers = self.lanternfish_counts.popleft()
 
-        self.lanternfish_counts[TIMER_VAL_RESET] += num_expiring_timers
         self.lanternfish_counts.append(num_expiring_timers)
+        self.lanternfish_counts[self.timer_val_reset] += num_expiring_timers
+
+    def _reduce(self, p: Polynomial) -> Polynomial:
+        """
+        Reduces a polynomial in T to one of degree at most timer_val_new
+        using T's characteristic polynomial: by Cayley-Hamilton,
+        T^(new + 1) = T^(new - reset) + I.
+        """
+        num_timer_vals = self.timer_val_new + 1
+        feedback = self.timer_val_new - self.timer_val_reset
+        for k in range(len(p) - 1, num_timer_vals - 1, -1):
+            if (coeff := p[k]):
+                p[k] = 0
+                p[k - num_timer_vals] += coeff
+                p[k - num_timer_vals + feedback] += coeff
+        return p[:num_timer_vals]
+
+    def _square(self, p: Polynomial) -> Polynomial:
+        res = [0] * (2 * len(p) - 1)
+        for i, a in enumerate(p):
+            if not a:
+                continue
+            res[2 * i] += a * a
+            for j in range(i + 1, len(p)):
+                if (b := p[j]):
+                    res[i + j] += (a * b) << 1
+        return self._reduce(res)
+
+    def transition_power(self, num_steps: int) -> Polynomial:
+        """
+        Returns T^num_steps by repeated squaring, as a polynomial in T.
+
+        This takes O(log num_steps) squarings of new + 1 coefficients,
+        rather than the (new + 1)^3 multiplications of squaring T itself.
+        """
+        if (res := self._powers.get(num_steps)) is not None:
+            return res
+
+        res = [1] + [0] * self.timer_val_new
+        for bit in f'{num_steps:b}':
+            res = self._square(res)
+            if bit == '1':
+                res = self._reduce([0] + res)
+
+        self._powers[num_steps] = res
+        return res
+
+    def advance(self, num_steps: int) -> None:
+        """
+        Equivalent to calling step() num_steps times, in O(log num_steps)
+        big integer operations.
+        """
+        # T^k applied to the current counts, for each power of T that
+        # appears in the reduced T^num_steps
+        states: list[list[int]] = []
+        for _ in range(self.timer_val_new + 1):
+            states.append(list(self.lanternfish_counts))
+            self.step()
+
+        coeffs = self.transition_power(num_steps)
+        self.lanternfish_counts = deque(
+            sum(coeff * state[timer]
+                for coeff, state in zip(coeffs, states) if coeff)
+            for timer in range(self.timer_val_new + 1))
 
     def get_count(self) -> int:
         return sum(self.lanternfish_counts)
 
+    def get_counts_at(self, horizons: Iterable[int]) -> list[int]:
+        """
+        Returns the fish count after each number of steps in horizons,
+        counted from the current state, which is advanced to the largest.
+
+        As T^n is a polynomial in T of degree at most new, the count n steps
+        after an anchor step is that combination of the counts at the
+        anchor and the new steps after it. The horizons are visited in
+        sorted order, each taking new + 1 products of a count with small
+        coefficients, and the anchor moves up to any horizon more than
+        MAX_ANCHOR_OFFSET past it, so the coefficients stay small.
+        """
+        horizons = list(horizons)
+        if any(horizon < 0 for horizon in horizons):
+            raise ValueError('horizons must not be negative')
+        num_timer_vals = self.timer_val_new + 1
+
+        # T^n for every offset from the anchor that does not move it, and
+        # for the new offsets after that needed to move it
+        offset_powers = [[1] + [0] * self.timer_val_new]
+        for _ in range(MAX_ANCHOR_OFFSET + self.timer_val_new):
+            offset_powers.append(self._reduce([0] + offset_powers[-1]))
+
+        initial_counts = self.lanternfish_counts.copy()
+        window: list[int] = []
+        for _ in range(num_timer_vals):
+            window.append(self.get_count())
+            self.step()
+        self.lanternfish_counts = initial_counts
+
+        counts: dict[int, int] = {}
+        anchor = 0
+        for horizon in sorted(set(horizons)):
+            if (offset := horizon - anchor) > MAX_ANCHOR_OFFSET:
+                power = (offset_powers[offset] if offset < len(offset_powers)
+                         else self.transition_power(offset))
+                moved: list[int] = []
+                for _ in range(num_timer_vals):
+                    moved.append(sum(coeff * count for coeff, count
+                                     in zip(power, window) if coeff))
+                    power = self._reduce([0] + power)
+                window = moved
+                anchor = horizon
+                offset = 0
+
+            counts[horizon] = sum(coeff * count for coeff, count
+                                  in zip(offset_powers[offset], window)
+                                  if coeff)
+
+        if horizons:
+            if (largest := max(horizons)) <= MAX_ANCHOR_OFFSET:
+                for _ in range(largest):
+                    self.step()
+            else:
+                self.advance(largest)
+        return [counts[horizon] for horizon in horizons]
+
 
 def get_initial_timers(inputs: TextIO) -> Generator[int, None, None]:
     for val in inputs.readline().rstrip().split(','):
         yield int(val)
 
 
-def do_sim(inputs: TextIO, num_steps: int) -> int:
-    sim = LanternfishSimulation(get_initial_timers(inputs))
-    for _ in range(num_steps):
-        sim.step()
+def do_sim(
+    inputs: TextIO,
+    num_steps: int,
+    power: bool = False,
+    timer_val_new: int = TIMER_VAL_NEW,
+    timer_val_reset: int = TIMER_VAL_RESET
+) -> int:
+    with phase('parse'):
+        sim = LanternfishSimulation(get_initial_timers(inputs),
+                                    timer_val_new, timer_val_reset)
+    with phase('solve'):
+        if power:
+            sim.advance(num_steps)
+        else:
+            for _ in range(num_steps):
+                sim.step()
 
     return sim.get_count()
 
@@ -54,10 +212,52 @@ def part2():
     print(do_sim(sys.stdin, 256))
 
 
+def allow_huge_ints():
+    if hasattr(sys, 'set_int_max_str_digits'):
+        sys.set_int_max_str_digits(0)
+
+
+def timer_options(f: Callable) -> Callable:
+    for option in reversed([
+        click.option('--new', 'timer_val_new', type=int,
+                     default=TIMER_VAL_NEW, show_default=True,
+                     help='Timer value of newborn fish.'),
+        click.option('--reset', 'timer_val_reset', type=int,
+                     default=TIMER_VAL_RESET, show_default=True,
+                     help='Timer value of fish that have just spawned.'),
+    ]):
+        f = option(f)
+    return f
+
+
 @main.command()
 @click.argument('N', type=int)
-def sim(n: int):
-    print(do_sim(sys.stdin, n))
+@click.option('--power', is_flag=True,
+              help='Jump ahead with powers of the transition matrix instead '
+              'of stepping one day at a time.')
+@timer_options
+def sim(n: int, power: bool, timer_val_new: int, timer_val_reset: int):
+    allow_huge_ints()
+    print(do_sim(sys.stdin, n, power, timer_val_new, timer_val_reset))
+
+
+@main.command()
+@click.argument('horizons', type=int, nargs=-1, required=True)
+@timer_options
+def sweep(horizons: tuple[int, ...], timer_val_new: int,
+          timer_val_reset: int):
+    """
+    Prints the fish count after each of HORIZONS steps, in one pass.
+    """
+    allow_huge_ints()
+    with phase('parse'):
+        sim = LanternfishSimulation(get_initial_timers(sys.stdin),
+                                    timer_val_new, timer_val_reset)
+    with phase('solve'):
+        counts = sim.get_counts_at(horizons)
+
+    for horizon, count in zip(horizons, counts):
+        print(horizon, count)
 
 
 if __name__ == '__main__':
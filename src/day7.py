@@ -3,8 +3,11 @@ import click
 import statistics
 import sys
 
+from profiling import phase, profile_option
+
 
 @click.group()
+@profile_option
 def main(): pass
 
 
@@ -15,9 +18,12 @@ def get_inputs(inputs: TextIO) -> Generator[int, None, None]:
 
 @main.command()
 def part1():
-    vals = list(get_inputs(sys.stdin))
-    median = statistics.median_low(vals)
-    print(sum(abs(val - median) for val in vals))
+    with phase('parse'):
+        vals = list(get_inputs(sys.stdin))
+    with phase('solve'):
+        median = statistics.median_low(vals)
+        res = sum(abs(val - median) for val in vals)
+    print(res)
 
 
 def fuel_cost(x: int, y: int) -> int:
@@ -27,12 +33,16 @@ def fuel_cost(x: int, y: int) -> int:
 
 @main.command()
 def part2():
-    vals = list(get_inputs(sys.stdin))
-    lb = min(vals)
-    ub = max(vals)
+    with phase('parse'):
+        vals = list(get_inputs(sys.stdin))
+
+    with phase('solve'):
+        lb = min(vals)
+        ub = max(vals)
 
-    print(min(sum(fuel_cost(val, dest) for val in vals)
-          for dest in range(lb, ub+1)))
+        res = min(sum(fuel_cost(val, dest) for val in vals)
+                  for dest in range(lb, ub+1))
+    print(res)
 
 
 if __name__ == '__main__':
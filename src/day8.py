@@ -5,8 +5,11 @@ from collections import defaultdict
 from dataclasses import dataclass
 from enum import Enum, auto
 
+from profiling import phase, profile_option
+
 
 @click.group()
+@profile_option
 def main(): pass
 
 
@@ -88,11 +91,15 @@ def can_only_be_one_digit(pattern: SignalPattern) -> bool:
 
 @main.command()
 def part1():
+    with phase('parse'):
+        observations = list(get_observations(sys.stdin))
+
     num_unique_digits = 0
-    for observation in get_observations(sys.stdin):
-        for pattern in observation.output:
-            if can_only_be_one_digit(pattern):
-                num_unique_digits += 1
+    with phase('solve'):
+        for observation in observations:
+            for pattern in observation.output:
+                if can_only_be_one_digit(pattern):
+                    num_unique_digits += 1
 
     print(num_unique_digits)
 
@@ -156,10 +163,14 @@ def decode_output_seq(
 
 @main.command()
 def part2():
+    with phase('parse'):
+        observations = list(get_observations(sys.stdin))
+
     tot = 0
-    for observation in get_observations(sys.stdin):
-        mapping = determine_mapping(observation.patterns)
-        tot += decode_output_seq(observation.output, mapping)
+    with phase('solve'):
+        for observation in observations:
+            mapping = determine_mapping(observation.patterns)
+            tot += decode_output_seq(observation.output, mapping)
     print(tot)
 
 
@@ -1,14 +1,25 @@
-from dataclasses import dataclass, replace
-from typing import Generator, TextIO
+from array import array
+from collections import defaultdict
+from dataclasses import dataclass
+from enum import Enum
+from typing import Generator, TextIO, TypeAlias
 from heapq import nlargest
 from math import prod
 import click
 import sys
+import numpy as np
+
+from digitgrid import DigitGrid
+from profiling import phase, profile_option
 
 WALL_HEIGHT = 9
 
+# The mark last set on each padded cell index by a basin search
+Visited: TypeAlias = array | defaultdict[int, int]
+
 
 @click.group()
+@profile_option
 def main(): pass
 
 
@@ -18,26 +29,58 @@ class Dimensions:
     w: int
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Point:
     r: int
     c: int
 
 
 class Heightmap:
-    _vals: list[list[int]]
+    """
+    The heights of a map, also stored surrounded by a border of walls so
+    that each cell's four neighbours are at fixed offsets from its index.
+    Hot paths address cells by these packed indices rather than by Point.
+    """
+    _vals: DigitGrid
     dims: Dimensions
+    padded: bytearray
+    stride: int
+    neighbor_offsets: tuple[int, int, int, int]
 
-    def __init__(self, vals: list[list[int]]) -> None:
+    def __init__(self, vals: DigitGrid) -> None:
         self._vals = vals
-        self.dims = Dimensions(h=len(vals), w=len(vals[0]))
+        self.dims = Dimensions(h=vals.height, w=vals.width)
+
+        self.stride = vals.width + 2
+        wall = bytes((WALL_HEIGHT,))
+        self.padded = bytearray(wall * (self.stride + 1))
+        for r in range(vals.height):
+            self.padded += vals.row(r)
+            self.padded += wall * 2
+        self.padded += wall * (self.stride - 1)
+        self.neighbor_offsets = (-self.stride, -1, 1, self.stride)
 
     def __getitem__(self, point: Point) -> int:
-        return self._vals[point.r][point.c]
+        return self._vals.cells[point.r * self._vals.stride + point.c]
+
+    def idx(self, point: Point) -> int:
+        return (point.r + 1) * self.stride + point.c + 1
+
+    def point(self, idx: int) -> Point:
+        r, c = divmod(idx, self.stride)
+        return Point(r - 1, c - 1)
+
+    def padded_array(self) -> np.ndarray:
+        """
+        Returns the padded heights as an (h + 2, w + 2) array sharing their
+        memory.
+        """
+        return np.frombuffer(self.padded, dtype=np.uint8).reshape(
+            self.dims.h + 2, self.stride)
 
 
 def get_heightmap(inp: TextIO) -> Heightmap:
-    return Heightmap(list(list(int(v) for v in line.rstrip()) for line in inp))
+    return Heightmap(DigitGrid.load(inp))
 
 
 def adjacent_points(
@@ -45,13 +88,13 @@ def adjacent_points(
     point: Point
 ) -> Generator[Point, None, None]:
     if point.r > 0:
-        yield replace(point, r=point.r-1)
+        yield Point(point.r-1, point.c)
     if point.c > 0:
-        yield replace(point, c=point.c-1)
+        yield Point(point.r, point.c-1)
     if point.r < dims.h-1:
-        yield replace(point, r=point.r+1)
+        yield Point(point.r+1, point.c)
     if point.c < dims.w-1:
-        yield replace(point, c=point.c+1)
+        yield Point(point.r, point.c+1)
 
 
 def is_low_point(heightmap: Heightmap, point: Point) -> bool:
@@ -59,50 +102,216 @@ def is_low_point(heightmap: Heightmap, point: Point) -> bool:
                for adj_point in adjacent_points(heightmap.dims, point))
 
 
+def get_low_point_idxs(heightmap: Heightmap) -> Generator[int, None, None]:
+    heights = heightmap.padded
+    stride = heightmap.stride
+    for r in range(1, heightmap.dims.h + 1):
+        for idx in range(r * stride + 1, r * stride + heightmap.dims.w + 1):
+            height = heights[idx]
+            # Walls are never low points, so the border needs no checks
+            if (height < heights[idx - 1] and height < heights[idx + 1]
+                    and height < heights[idx - stride]
+                    and height < heights[idx + stride]):
+                yield idx
+
+
+def low_point_mask(heightmap: Heightmap) -> np.ndarray:
+    """
+    Returns an (h, w) array that is True at each low point, comparing every
+    cell with its four neighbours at once as shifted views of the padded
+    heights. Walls are never low points, so the border compares like any
+    other neighbour.
+    """
+    padded = heightmap.padded_array()
+    inner = padded[1:-1, 1:-1]
+    return ((inner < padded[:-2, 1:-1]) & (inner < padded[2:, 1:-1])
+            & (inner < padded[1:-1, :-2]) & (inner < padded[1:-1, 2:]))
+
+
 def get_low_points(heightmap: Heightmap) -> Generator[Point, None, None]:
-    for r in range(heightmap.dims.h):
-        for c in range(heightmap.dims.w):
-            point = Point(r, c)
-            if is_low_point(heightmap, point):
-                yield point
+    for idx in get_low_point_idxs(heightmap):
+        yield heightmap.point(idx)
 
 
 def risk_level(heightmap: Heightmap, point: Point) -> int:
     return heightmap[point] + 1
 
 
-@main.command()
-def part1():
-    heightmap = get_heightmap(sys.stdin)
-    print(sum(risk_level(heightmap, point)
-          for point in get_low_points(heightmap)))
+class LowPointEngine(Enum):
+    SCALAR = 'scalar'
+    NUMPY = 'numpy'
 
 
-def get_basin_size(heightmap: Heightmap, low_point: Point) -> int:
-    visited: set[Point] = {low_point}
-    to_visit: list[Point] = [low_point]
+@main.command()
+@click.option('--engine', type=click.Choice([e.value for e in LowPointEngine]),
+              default=LowPointEngine.SCALAR.value, show_default=True,
+              help='Check cells one at a time, or all at once with array '
+              'comparisons.')
+def part1(engine: str):
+    with phase('parse'):
+        heightmap = get_heightmap(sys.stdin)
+    with phase('solve'):
+        if LowPointEngine(engine) == LowPointEngine.NUMPY:
+            mask = low_point_mask(heightmap)
+            inner = heightmap.padded_array()[1:-1, 1:-1]
+            res = int(inner.sum(where=mask, dtype=np.int64)) + int(mask.sum())
+        else:
+            res = sum(heightmap.padded[idx] + 1
+                      for idx in get_low_point_idxs(heightmap))
+    print(res)
+
+
+def get_basin_size_at(
+    heightmap: Heightmap,
+    low_idx: int,
+    visited: Visited,
+    mark: int
+) -> int:
+    """
+    Returns the size of the basin around the cell at low_idx. Its cells are
+    set to mark in visited, which is indexed like heightmap.padded, so one
+    visited array serves many basins given distinct marks. A defaultdict
+    holds just the basin's cells instead.
+    """
+    heights = heightmap.padded
+    offsets = heightmap.neighbor_offsets
+    visited[low_idx] = mark
+    to_visit: list[int] = [low_idx]
     size = 0
 
-    while len(to_visit) > 0:
-        point = to_visit.pop()
+    while to_visit:
+        idx = to_visit.pop()
         size += 1
 
-        for point in adjacent_points(heightmap.dims, point):
-            if heightmap[point] < WALL_HEIGHT and point not in visited:
-                visited.add(point)
-                to_visit.append(point)
+        for offset in offsets:
+            adj_idx = idx + offset
+            if heights[adj_idx] < WALL_HEIGHT and visited[adj_idx] != mark:
+                visited[adj_idx] = mark
+                to_visit.append(adj_idx)
 
     return size
 
 
+def new_visited(heightmap: Heightmap) -> array:
+    return array('I', bytes(len(heightmap.padded) * array('I').itemsize))
+
+
+def get_basin_size(heightmap: Heightmap, low_point: Point) -> int:
+    # A visited array would cost the whole map for one basin
+    return get_basin_size_at(heightmap, heightmap.idx(low_point),
+                             defaultdict(int), 1)
+
+
 def get_basin_sizes(heightmap: Heightmap) -> Generator[int, None, None]:
-    for point in get_low_points(heightmap):
-        yield get_basin_size(heightmap, point)
+    visited = new_visited(heightmap)
+    for mark, idx in enumerate(get_low_point_idxs(heightmap), 1):
+        yield get_basin_size_at(heightmap, idx, visited, mark)
+
+
+@dataclass
+class BasinLabels:
+    """
+    The basins of a heightmap as connected regions of non-wall cells.
+    labels[r, c] is 0 for walls and otherwise the basin's number, counting
+    from 1 in row-major order of each basin's first cell.
+    """
+    labels: np.ndarray
+    sizes: np.ndarray
+
+    def basin_at(self, point: Point) -> int:
+        return int(self.labels[point.r, point.c])
+
+    def basin_size(self, label: int) -> int:
+        return int(self.sizes[label - 1])
+
+
+def label_basins(heightmap: Heightmap) -> BasinLabels:
+    """
+    Labels every basin at once with array operations over the padded
+    heights, whose wall border ends every run of open cells within its row.
+
+    The open cells are split into horizontal runs, and runs in consecutive
+    rows that touch are joined with a union-find over run ids: each round
+    hooks the larger root of every edge whose ends differ onto the smaller,
+    then jumps every run to its root. Edges whose ends agree stay joined, so
+    each round only keeps the rest.
+    """
+    heights = heightmap.padded_array().ravel()
+    stride = heightmap.stride
+    is_open = heights < WALL_HEIGHT
+    dtype = np.int32 if heights.size < 2 ** 31 else np.int64
+
+    run_starts = is_open.copy()
+    run_starts[1:] &= ~is_open[:-1]
+    run_ends = is_open.copy()
+    run_ends[:-1] &= ~is_open[1:]
+    run_lengths = np.flatnonzero(run_ends) - np.flatnonzero(run_starts) + 1
+    del run_ends
+    run_ids = np.cumsum(run_starts, dtype=dtype)
+    run_ids -= 1
+    num_runs = len(run_lengths)
+    del run_starts
+    if num_runs == 0:
+        return BasinLabels(
+            np.zeros((heightmap.dims.h, heightmap.dims.w), dtype=dtype),
+            np.zeros(0, dtype=np.int64))
+
+    # A vertical contact next to another one joins the same two runs
+    touching = is_open[:-stride] & is_open[stride:]
+    first_contacts = touching.copy()
+    first_contacts[1:] &= ~touching[:-1]
+    upper = np.flatnonzero(first_contacts)
+    del touching, first_contacts
+    upper_runs = run_ids[upper]
+    lower_runs = run_ids[upper + stride]
+    del upper
+
+    roots = np.arange(num_runs, dtype=dtype)
+    while len(upper_runs):
+        upper_roots = roots[upper_runs]
+        lower_roots = roots[lower_runs]
+        apart = upper_roots != lower_roots
+        upper_runs = upper_runs[apart]
+        lower_runs = lower_runs[apart]
+        upper_roots = upper_roots[apart]
+        lower_roots = lower_roots[apart]
+        roots[np.maximum(upper_roots, lower_roots)] = np.minimum(upper_roots,
+                                                                 lower_roots)
+        while not np.array_equal(jumped := roots[roots], roots):
+            roots = jumped
+
+    is_first = roots == np.arange(num_runs, dtype=dtype)
+    run_labels = np.cumsum(is_first, dtype=dtype)[roots]
+    sizes = np.bincount(run_labels - 1, weights=run_lengths,
+                        minlength=int(is_first.sum())).astype(np.int64)
+
+    del run_ids
+    labels = np.zeros(heights.size, dtype=dtype)
+    labels[is_open] = np.repeat(run_labels, run_lengths)
+    labels = labels.reshape(heightmap.dims.h + 2, stride)
+    return BasinLabels(labels[1:-1, 1:-1], sizes)
+
+
+class Engine(Enum):
+    FLOOD = 'flood'
+    LABELS = 'labels'
 
 
 @main.command()
-def part2():
-    print(prod(nlargest(3, get_basin_sizes(get_heightmap(sys.stdin)))))
+@click.option('--engine', type=click.Choice([e.value for e in Engine]),
+              default=Engine.FLOOD.value, show_default=True,
+              help='Flood fill from each low point, or label every basin '
+              'at once with array operations.')
+def part2(engine: str):
+    with phase('parse'):
+        heightmap = get_heightmap(sys.stdin)
+    with phase('solve'):
+        if Engine(engine) == Engine.LABELS:
+            sizes = label_basins(heightmap).sizes
+            res = prod(int(size) for size in np.sort(sizes)[-3:])
+        else:
+            res = prod(nlargest(3, get_basin_sizes(heightmap)))
+    print(res)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,98 @@
+from typing import BinaryIO, TextIO
+import os
+
+READ_CHUNK_SIZE = 1 << 20
+
+_DIGIT_VALUES = bytes.maketrans(b'0123456789', bytes(range(10)))
+_DIGIT_CHARS = bytes.maketrans(bytes(range(10)), b'0123456789')
+_VALUE_BYTES = bytes(range(10))
+
+
+class DigitGrid:
+    """
+    A rectangular grid of single-digit values, stored row-major as one byte
+    per cell. Cell (r, c) is at cells[r * stride + c].
+    """
+    cells: bytearray
+    height: int
+    width: int
+    stride: int
+
+    def __init__(self, cells: bytearray, height: int, width: int) -> None:
+        if len(cells) != height * width:
+            raise ValueError(
+                f'{len(cells)} cells do not make a {height}x{width} grid')
+        self.cells = cells
+        self.height = height
+        self.width = width
+        self.stride = width
+
+    @staticmethod
+    def from_bytes(data: bytes | bytearray) -> "DigitGrid":
+        # Trailing blanks on a line are rare, so lines are only split when
+        # there are blanks at all
+        if b' ' in data or b'\t' in data:
+            data = bytearray(b'\n'.join(
+                line.rstrip() for line in data.splitlines()))
+
+        end = len(data)
+        while end and data[end-1] in b'\r\n':
+            end -= 1
+        eol_len = 1
+        width = data.find(b'\n', 0, end)
+        if width == -1:
+            width = end
+        elif width and data[width-1] == ord('\r'):
+            width -= 1
+            eol_len = 2
+        height = data.count(b'\n', 0, end) + 1
+
+        # Every row but the last ends in a newline exactly one row after the
+        # previous one, and the cell count then checks the last row
+        row_len = width + eol_len
+        if (width == 0 or data[row_len-1:end:row_len] != b'\n' * (height-1)):
+            raise ValueError('grid rows are not all the same width')
+
+        cells = data.translate(_DIGIT_VALUES, b'\r\n')
+        if not isinstance(cells, bytearray):
+            cells = bytearray(cells)
+        if height * width != len(cells):
+            raise ValueError('grid rows are not all the same width')
+        if cells.translate(None, _VALUE_BYTES):
+            raise ValueError('grid cells are not all digits')
+        return DigitGrid(cells, height, width)
+
+    @staticmethod
+    def load(inp: TextIO | BinaryIO) -> "DigitGrid":
+        # Reading into a bytearray lets translate() produce the cells without
+        # a further copy
+        buffer = getattr(inp, 'buffer', inp)
+        data = bytearray()
+        while chunk := buffer.read(READ_CHUNK_SIZE):
+            # Text streams without a binary buffer, such as StringIO
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data += chunk
+        return DigitGrid.from_bytes(data)
+
+    @staticmethod
+    def from_file(path: str | os.PathLike) -> "DigitGrid":
+        with open(path, 'rb') as f:
+            return DigitGrid.load(f)
+
+    def __getitem__(self, idx: int) -> int:
+        return self.cells[idx]
+
+    def __setitem__(self, idx: int, val: int):
+        self.cells[idx] = val
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def row(self, r: int) -> memoryview:
+        start = r * self.stride
+        return memoryview(self.cells)[start:start+self.width]
+
+    def __str__(self) -> str:
+        return '\n'.join(bytes(self.row(r)).translate(_DIGIT_CHARS).decode()
+                         for r in range(self.height))
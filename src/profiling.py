@@ -0,0 +1,105 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Callable, Generator, Optional, TextIO, TypeVar
+import cProfile
+import pstats
+import sys
+import tracemalloc
+import click
+
+
+@dataclass
+class PhaseStats:
+    name: str
+    wall: float
+    peak_bytes: int
+    net_blocks: int
+    net_bytes: int
+    calls: int
+
+
+_TRACE_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+]
+
+
+class PhaseProfiler:
+    phases: list[PhaseStats]
+
+    def __init__(self) -> None:
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name: str) -> Generator[None, None, None]:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+        tracemalloc.reset_peak()
+        profile = cProfile.Profile()
+        start = perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            wall = perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+            tracemalloc.stop()
+
+            diff = after.compare_to(before, 'filename')
+            self.phases.append(PhaseStats(
+                name=name,
+                wall=wall,
+                peak_bytes=peak,
+                net_blocks=sum(stat.count_diff for stat in diff),
+                net_bytes=sum(stat.size_diff for stat in diff),
+                calls=pstats.Stats(profile).total_calls))  # type: ignore
+
+    def report(self, out: TextIO):
+        for p in self.phases:
+            print(f'{p.name:8} '
+                  f'wall {p.wall * 1e3:10.3f}ms '
+                  f'peak {p.peak_bytes / 1024:10.1f}KiB '
+                  f'allocs {p.net_blocks:+9d} blocks '
+                  f'({p.net_bytes / 1024:+.1f}KiB) '
+                  f'calls {p.calls:9d}', file=out)
+
+
+_profiler: Optional[PhaseProfiler] = None
+
+
+@contextmanager
+def phase(name: str) -> Generator[None, None, None]:
+    """
+    Marks a block of a day's command as one phase (e.g. 'parse' or 'solve').
+
+    This is a no-op unless the day's group was invoked with --profile.
+    """
+    if _profiler is None:
+        yield
+        return
+
+    with _profiler.phase(name):
+        yield
+
+
+def _enable_profiling(ctx: click.Context, _, value: bool):
+    global _profiler
+    if not value:
+        _profiler = None
+        return
+
+    profiler = _profiler = PhaseProfiler()
+    ctx.call_on_close(lambda: profiler.report(sys.stderr))
+
+
+F = TypeVar('F', bound=Callable)
+
+
+def profile_option(f: F) -> F:
+    return click.option(
+        '--profile', is_flag=True, expose_value=False,
+        callback=_enable_profiling,
+        help='Report time, allocations and calls per phase on stderr.')(f)
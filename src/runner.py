@@ -0,0 +1,46 @@
+from contextlib import redirect_stdout
+from pathlib import Path
+from types import ModuleType
+from typing import Sequence
+import importlib
+import io
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+DAYS = range(1, 26)
+
+
+def load_day(day: int) -> ModuleType:
+    return importlib.import_module(f'day{day}')
+
+
+def available_days() -> list[int]:
+    src = Path(__file__).resolve().parent
+    return [day for day in DAYS if (src / f'day{day}.py').exists()]
+
+
+def input_files(day: int) -> list[Path]:
+    paths = [ROOT / 'inputs' / f'day{day}.txt',
+             ROOT / 'examples' / f'day{day}.txt']
+    paths.extend(sorted((ROOT / 'examples').glob(f'day{day}_*.txt')))
+    return [path for path in paths if path.exists()]
+
+
+def run_command(module: ModuleType, args: Sequence[str], data: bytes) -> str:
+    """
+    Runs one of a day module's click commands in-process, feeding it data
+    on stdin.
+
+    Returns everything the command printed, without the trailing newline.
+    """
+    out = io.StringIO()
+    stdin = sys.stdin
+    sys.stdin = io.TextIOWrapper(io.BytesIO(data))
+    try:
+        with redirect_stdout(out):
+            module.main.main(list(args), prog_name=module.__name__,
+                             standalone_mode=False)
+    finally:
+        sys.stdin = stdin
+
+    return out.getvalue().rstrip('\n')